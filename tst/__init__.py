@@ -1,4 +1,4 @@
-from .utils import _assert, cprint
+from .utils import _assert, cprint, TstError
 from .colors import *
 
 from .tst import coverit
@@ -0,0 +1,88 @@
+# batch
+#
+# Runs a pytest test file against many subjects in a single interpreter. For
+# each subject, a fresh pytest session is run in-process with the arguments
+# of the default script (`pytest TESTFILE --tst SUBJECT --clean`), so
+# subjects no longer pay for interpreter startup and pytest imports. One json report line (the format
+# parse_test_report understands) is written per subject. This module is
+# executed as a script, so it must depend on the stdlib (and pytest) only.
+
+import os
+import sys
+import json
+import time
+import signal
+import resource
+
+OUTCOME_CODES = {'passed': '.', 'failed': 'F'}
+
+
+class Collector:
+
+    def __init__(self):
+        self.summary = []
+        self.feedback = []
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.summary.append('E')
+            self.feedback.append(f'collection error: {report.nodeid}')
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == 'call' and report.outcome in OUTCOME_CODES:
+            self.summary.append(OUTCOME_CODES[report.outcome])
+            if report.failed:
+                self.feedback.append(f'failed: {report.nodeid}')
+
+        elif report.when != 'call' and report.failed:
+            self.summary.append('E')
+            self.feedback.append(f'{report.when} error: {report.nodeid}')
+
+
+def purge_modules(directories):
+    # forget modules loaded from the test/subject directories (and undertst)
+    # so the next session imports them again for the next subject
+    for name, module in list(sys.modules.items()):
+        filename = getattr(module, '__file__', None)
+        if name == 'undertst' or filename and os.path.dirname(os.path.abspath(filename)) in directories:
+            del sys.modules[name]
+
+
+def run_batch(testfile, subjects, timeout):
+    import pytest
+
+    # keep the original stdout for reports; pytest's own output is dropped
+    report = os.fdopen(os.dup(1), 'w')
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    directories = {os.path.abspath(os.path.dirname(testfile))}
+    directories.update(os.path.abspath(os.path.dirname(s)) for s in subjects)
+
+    def alarm_handler(_1, _2):
+        # subject running too long: report it and leave the rest to the caller
+        print(json.dumps({'subject': subject, 'timeout': True}), file=report, flush=True)
+        os._exit(0)
+
+    signal.signal(signal.SIGALRM, alarm_handler)
+    for subject in subjects:
+        purge_modules(directories)
+        sys.argv = ['pytest', testfile, '--tst', subject]
+        collector = Collector()
+        t0, r0 = time.monotonic(), resource.getrusage(resource.RUSAGE_SELF)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        pytest.main([testfile, '--tst', subject, '--clean', '-q', '-p', 'no:cacheprovider'], plugins=[collector])
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        r1 = resource.getrusage(resource.RUSAGE_SELF)
+        print(json.dumps({
+            'subject': subject,
+            'summary': ''.join(collector.summary) or 'E',
+            'feedback': '\n'.join(collector.feedback) or None,
+            'time': time.monotonic() - t0,
+            'user_time': r1.ru_utime - r0.ru_utime,
+            'sys_time': r1.ru_stime - r0.ru_stime
+        }), file=report, flush=True)
+
+
+if __name__ == '__main__':
+    sys.path.pop(0)
+    run_batch(sys.argv[1], sys.argv[3:], float(sys.argv[2]))
@@ -0,0 +1,150 @@
+import os
+import shlex
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import tst
+from tst.cache import file_digest
+from tst.process import run_process
+from tst.utils import to_unicode
+
+BUILD_TIMEOUT = 60
+BUILD_CACHE_SIZE_DEFAULT = 256 # megabytes
+
+_lock = threading.Lock()
+_key_locks = {}
+
+# builds stored since the last evict
+built = 0
+
+
+def _lock_for(key):
+    with _lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def expand(command, filename, build_dir):
+    command = command.replace('{build}', shlex.quote(build_dir))
+    return command.replace('{}', shlex.quote(filename))
+
+
+def build(filename, command, directory=None):
+    # Builds filename with command (where {} is the subject and {build} the
+    # build directory) once per subject name and contents. Returns the build
+    # directory and None, or None and the error output of a failed build.
+    global built
+    directory = directory or os.path.join(tst.tst.CONFIGDIR, 'build')
+
+    # the name matters too (e.g. java classes are named after their files)
+    key = f'{command}\0{os.path.basename(filename)}\0{file_digest(filename)}'
+    key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    target = os.path.join(directory, key)
+    failed = target + '.failed'
+
+    with _lock_for(key):
+        # hits are touched: evict drops the least recently used builds
+        if os.path.isdir(target):
+            touch(target)
+            return target, None
+
+        if os.path.exists(failed):
+            touch(failed)
+            with open(failed, encoding='utf-8') as f:
+                return None, f.read()
+
+        os.makedirs(directory, exist_ok=True)
+        build_dir = tempfile.mkdtemp(dir=directory, prefix=key + '.')
+        try:
+            child = run_process(shlex.split(expand(command, filename, build_dir)), timeout=BUILD_TIMEOUT)
+        except OSError as e:
+            # missing compiler, bad PATH, etc: not the subject's fault (and
+            # not cached, so builds work as soon as the environment is fixed)
+            shutil.rmtree(build_dir, ignore_errors=True)
+            return None, f'build error: {e}'
+
+        if child['returncode'] != 0:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            error = to_unicode(child['stdout'] + child['stderr'])
+            if child['timeout']:
+                return None, f'build timeout: {command}'
+
+            # only real compilation errors are remembered (not signals)
+            if child['returncode'] > 0:
+                with open(failed, 'w', encoding='utf-8') as f:
+                    f.write(error)
+                with _lock:
+                    built += 1
+            return None, error
+
+        # another tst process may have built the same subject meanwhile
+        try:
+            os.rename(build_dir, target)
+        except OSError:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+        with _lock:
+            built += 1
+        return target, None
+
+
+def touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def disk_usage(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+
+    size = 0
+    for root, _, filenames in os.walk(path):
+        for fn in filenames:
+            try:
+                size += os.path.getsize(os.path.join(root, fn))
+            except OSError:
+                pass
+    return size
+
+
+def evict(directory=None, max_size=None):
+    # drop least recently used builds (directories and .failed files) until
+    # the build directory fits max_size
+    global built
+    directory = directory or os.path.join(tst.tst.CONFIGDIR, 'build')
+    max_size = max_size or tst.get_config().get('build-cache-size', BUILD_CACHE_SIZE_DEFAULT) * 1024 * 1024
+    with _lock:
+        built = 0
+
+    entries = []
+    total = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            mtime, size = os.stat(path).st_mtime, disk_usage(path)
+        except OSError:
+            continue
+        entries.append((mtime, size, name))
+        total += size
+
+    entries.sort()
+    for _, size, name in entries:
+        if total <= max_size:
+            break
+        path = os.path.join(directory, name)
+        with _lock_for(name.split('.')[0]):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+        total -= size
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+import concurrent.futures
+
+import tst
+
+CACHE_SIZE_DEFAULT = 64 # megabytes
+SUITE_CACHE_VERSION = 2
+FINGERPRINTS_MAX = 100000 # entries kept in the fingerprint index
+RACY_SECONDS = 2 # files modified this recently may change within the same mtime
+
+
+def _md5(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+class FingerprintIndex:
+
+    # Persistent md5 digests of files, keyed by path, inode, mtime and size,
+    # so unchanged files are never hashed again (not even across runs). Used
+    # by the result cache, builds and the log report.
+
+    def __init__(self, filename=None):
+        self.filename = filename or os.path.join(tst.tst.CONFIGDIR, 'fingerprints.json')
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.hashed = 0
+        try:
+            with open(self.filename, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _lookup(self, path):
+        # returns (key, stamp, digest or None)
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[:3] == stamp:
+            return key, stamp, entry[3]
+
+        return key, stamp, None
+
+    def _record(self, key, stamp, digest):
+        # a file modified right now could change again without a new mtime
+        if time.time() - stamp[1] / 1e9 < RACY_SECONDS:
+            return
+
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = stamp + [digest]
+            self.dirty = True
+
+    def digest(self, path):
+        key, stamp, digest = self._lookup(path)
+        if digest is None:
+            digest = _md5(path)
+            self._record(key, stamp, digest)
+            with self.lock:
+                self.hashed += 1
+
+        return digest
+
+    def update(self, paths):
+        # hashes new and changed files in parallel (reading and hashing
+        # release the gil) and saves the index
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            for _ in executor.map(self._try_digest, paths):
+                pass
+        self.save()
+
+    def _try_digest(self, path):
+        try:
+            self.digest(path)
+        except OSError:
+            pass
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            # least recently hashed entries go first
+            entries = dict(list(self.entries.items())[-FINGERPRINTS_MAX:])
+            self.dirty = False
+
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            tmp = f'{self.filename}.{os.getpid()}.{threading.get_ident()}'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.filename)
+        except OSError:
+            pass
+
+
+_fingerprints = None
+_fingerprints_lock = threading.Lock()
+
+def fingerprints():
+    # the process wide fingerprint index
+    global _fingerprints
+    with _fingerprints_lock:
+        if _fingerprints is None:
+            _fingerprints = FingerprintIndex()
+        return _fingerprints
+
+
+def file_digest(path):
+    return fingerprints().digest(path)
+
+
+class ResultCache:
+
+    def __init__(self, directory=None, max_size=None):
+        config = tst.get_config()
+        self.directory = directory or os.path.join(tst.tst.CONFIGDIR, 'results')
+        self.max_size = max_size or config.get('cache-size', CACHE_SIZE_DEFAULT) * 1024 * 1024
+        self.lock = threading.Lock()
+        self.digests = {}
+        self.stored = 0
+        self.hits = 0
+
+    def digest(self, path):
+        # subjects are hashed once per cache, no matter how many tests they run
+        with self.lock:
+            if path not in self.digests:
+                self.digests[path] = file_digest(path)
+            return self.digests[path]
+
+    def key(self, *parts):
+        data = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                result = json.load(f)
+            os.utime(path) # mark as recently used
+        except (OSError, ValueError):
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return result
+
+    def put(self, key, result):
+        path = self._path(key)
+        data = {k: v for k, v in result.items() if not k.startswith('_')}
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, default=str)
+            os.replace(tmp, path)
+        except OSError:
+            return
+
+        with self.lock:
+            self.stored += 1
+
+    def evict(self):
+        # drop least recently used entries until the cache fits max_size
+        entries = []
+        total = 0
+        for root, _, filenames in os.walk(self.directory):
+            for fn in filenames:
+                path = os.path.join(root, fn)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class SuiteCache:
+
+    # Compiled test suites (lists of TestCase), one entry per suite path. An
+    # entry is valid while the file keeps its mtime and size and the extra
+    # data given by the caller (e.g. config options) is the same.
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(tst.tst.CONFIGDIR, 'suites')
+
+    def _path(self, tspath):
+        key = hashlib.sha256(os.path.abspath(tspath).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.pickle')
+
+    def _stamp(self, tspath, extra):
+        stat = os.stat(tspath)
+        return [SUITE_CACHE_VERSION, stat.st_mtime_ns, stat.st_size, extra]
+
+    def get(self, tspath, extra=None):
+        try:
+            with open(self._path(tspath), 'rb') as f:
+                stamp, test_cases = pickle.load(f)
+            if stamp != self._stamp(tspath, extra):
+                return None
+        except Exception:
+            # missing, stale or unreadable entries are simply rebuilt
+            return None
+
+        return test_cases
+
+    def put(self, tspath, test_cases, extra=None):
+        path = self._path(tspath)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}'
+            with open(tmp, 'wb') as f:
+                pickle.dump((self._stamp(tspath, extra), test_cases), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except (OSError, pickle.PicklingError):
+            pass
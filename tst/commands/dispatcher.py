@@ -1,18 +1,16 @@
 import os
 import sys
+import shutil
 import logging
 from subprocess import check_call, CalledProcessError
-from distutils.spawn import find_executable
 
-import tst
 from tst.colors import *
-from tst.utils import cprint
+from tst.utils import cprint, log_handler
 
-config = tst.get_config()
+# keep this module light: it is imported on every tst invocation, so heavy
+# modules are imported only by the commands that need them
 log = logging.getLogger('dispatcher')
-handler_file = logging.FileHandler(os.path.expanduser('~/.tst/logs'))
-handler_file.setFormatter(logging.Formatter('%(asctime)s|%(name)s|%(levelname)s|%(message)s'))
-log.addHandler(handler_file)
+log.addHandler(log_handler())
 log.setLevel(logging.DEBUG)
 
 
@@ -36,7 +34,15 @@ def dispatcher(args):
         import tst.commands.version as version
         version.main()
 
-    elif find_executable(f'tst-{first_arg}'):
+    elif first_arg == 'serve':
+        import tst.commands.serve as serve
+        serve.main()
+
+    elif first_arg == 'worker':
+        import tst.commands.worker as worker
+        worker.main()
+
+    elif shutil.which(f'tst-{first_arg}'):
         cprint(YELLOW, f"external command: tst-{first_arg}")
         command_name = args.pop(0)
         run_external_command(command_name, args)
@@ -0,0 +1,164 @@
+# tst serve
+#
+# Long running grading daemon. Parsed suites (and their fork servers, result
+# cache, etc.) are kept in memory by one Runner per set of suites, and jobs
+# are accepted over a unix domain socket, one json object per line:
+#
+#   {"suite": "/path/tests.yaml", "subject": "/path/subject.py"}
+#   {"suite": ["a.yaml", "b.yaml"], "filename": "subject.py", "source": "..."}
+#
+# Each response is a single line with the json report for the subject (the
+# same map `tst -f json` prints) or {"error": "..."}. When too many jobs are
+# waiting, new ones are answered with {"error": "busy"} right away.
+
+import os
+import sys
+import json
+import signal
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import socketserver
+
+import tst
+from tst.colors import *
+from tst.utils import cprint, log_handler
+
+SOCKET_DEFAULT = '~/.tst/tst.sock'
+BACKLOG_DEFAULT = 128
+
+log = logging.getLogger('tst-serve')
+log.setLevel(logging.DEBUG)
+log.addHandler(log_handler())
+
+
+class GradingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, path, options):
+        self.options = options
+        self.runners = {}
+        self.lock = threading.Lock()
+        self.active = threading.BoundedSemaphore(options.concurrency)
+        self.waiting = threading.BoundedSemaphore(options.backlog)
+        super().__init__(path, RequestHandler)
+
+    def runner(self, suites):
+        from tst.runner import Runner
+
+        key = tuple(suites)
+        with self.lock:
+            runner = self.runners.get(key)
+            if runner is None or runner.is_stale():
+                runner and runner.close()
+                runner = self.runners[key] = Runner(
+                    suites,
+                    ignore=self.options.ignore,
+                    timeout=self.options.timeout,
+                    jobs=self.options.jobs,
+                    fork_server=self.options.fork_server,
+                    cache=self.options.cache
+                )
+
+        return runner
+
+    def grade(self, request):
+        suites = request['suite']
+        suites = [suites] if isinstance(suites, str) else list(suites)
+        runner = self.runner(suites)
+        if 'source' not in request:
+            results = runner.run([request['subject']])
+            return {request['subject']: results.get(request['subject'], {})}
+
+        # subject sent as source: grade a private copy of it
+        filename = os.path.basename(request['filename'])
+        with tempfile.TemporaryDirectory(prefix='tst-serve-') as directory:
+            path = os.path.join(directory, filename)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(request['source'])
+            results = runner.run([path])
+            return {filename: results.get(path, {})}
+
+    def close(self):
+        with self.lock:
+            for runner in self.runners.values():
+                runner.close()
+            self.runners = {}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = self.process(request)
+            except (ValueError, KeyError, TypeError) as e:
+                response = {'error': f'invalid request: {e.__class__.__name__}: {e}'}
+            except (SystemExit, Exception) as e:
+                # grading errors (e.g. _assert on a bad spec) must still be
+                # answered, or the client would wait forever
+                log.warning(f'grading error: REQUEST=`{line!r}` ERROR={e.__class__.__name__} MSG=`{e}`')
+                response = {'error': f'{e}'}
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+    def process(self, request):
+        # back-pressure: refuse jobs beyond the backlog instead of piling up
+        if not self.server.waiting.acquire(blocking=False):
+            return {'error': 'busy'}
+
+        try:
+            with self.server.active:
+                return self.server.grade(request)
+        finally:
+            self.server.waiting.release()
+
+
+def remove_stale_socket(path):
+    if not os.path.exists(path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(path)
+            return
+
+    cprint(LRED, f"tst serve: already running at {path}")
+    sys.exit(1)
+
+
+def main():
+    from tst.commands.test import TIMEOUT_DEFAULT
+
+    parser = argparse.ArgumentParser(prog='tst serve')
+    parser.add_argument('-s', '--socket', default=SOCKET_DEFAULT, help=f'listen at SOCKET (default: {SOCKET_DEFAULT})')
+    parser.add_argument('-T', '--timeout', type=int, default=TIMEOUT_DEFAULT, help='stop execution at TIMEOUT seconds')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='tests run concurrently for each job (default: 1)')
+    parser.add_argument('-C', '--concurrency', type=int, default=os.cpu_count() or 1, help='jobs graded concurrently (default: number of cpus)')
+    parser.add_argument('-b', '--backlog', type=int, default=BACKLOG_DEFAULT, help=f'jobs accepted before answering busy (default: {BACKLOG_DEFAULT})')
+    parser.add_argument('--fork-server', action="store_true", default=False, help='fork python subjects from a warm interpreter')
+    parser.add_argument('--no-cache', dest='cache', action="store_false", default=True, help='do not reuse nor store cached test results')
+    options = parser.parse_args(sys.argv[2:])
+    options.ignore = tst.read_specification()['ignore']
+    options.backlog = max(options.backlog, options.concurrency)
+
+    path = os.path.expanduser(options.socket)
+    remove_stale_socket(path)
+    server = GradingServer(path, options)
+    cprint(LGREEN, f"tst serve: listening at {path}")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.close()
+        os.path.exists(path) and os.remove(path)
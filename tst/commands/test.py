@@ -3,7 +3,6 @@ import re
 import sys
 import json
 import shlex
-import signal
 import string
 import argparse
 import logging
@@ -11,19 +10,28 @@ import itertools
 import queue
 import threading
 import time
-import difflib
+import signal
 from pathlib import Path
 from fnmatch import fnmatch
 from fnmatch import filter as fnfilter
+from fnmatch import translate as fntranslate
 
 from tst.jsonfile import JsonFile
 import tst
-from tst.utils import _assert
+from tst.utils import _assert, TstExit, log_handler
 from tst.utils import to_unicode
 from tst.utils import cprint
 from tst.colors import *
-
-from subprocess import Popen, PIPE, TimeoutExpired
+from tst.scheduler import Scheduler, AdaptiveLimit
+from tst.process import run_process, LIMITS
+from tst.cache import ResultCache, SuiteCache, fingerprints, file_digest
+from tst.forkserver import ForkServer
+from tst.history import FailureHistory
+from tst.scratch import ScratchDirs
+from tst.matcher import OrderedMatcher, is_literal
+import tst.build
+import tst.diff
+import tst.batch
 
 
 PYTHON = 'python3'
@@ -33,6 +41,31 @@ if sys.version_info < (3,6):
 
 TIMEOUT_DEFAULT = 10
 
+OUTPUT_LIMIT_DEFAULT = 1024 * 1024 # bytes captured per output stream
+REPORT_LIMIT_DEFAULT = 64 * 1024 # characters of stdout/stderr kept in reports
+
+# maximum number of subjects per batched pytest session
+BATCH_SIZE = 50
+
+# statuses depending on the grading environment rather than on the subject
+UNCACHEABLE = ['Timeout', 'ScriptTestError']
+
+# resources used by each test run (as reported by wait4): cpu times are in
+# seconds, maxrss is in kilobytes
+RESOURCES = ['user_time', 'sys_time', 'maxrss']
+
+# a timed out run that got less cpu time than this fraction of its wall time
+# was starved (e.g. by an overloaded machine) rather than looping; one using
+# more than BUSY_RATIO was busy all along and would just time out again
+STARVED_RATIO = 0.5
+BUSY_RATIO = 0.9
+
+# messages of subjects failing to allocate memory (under a memory limit)
+MEMORY_ERRORS = ['MemoryError', 'OutOfMemoryError', 'std::bad_alloc', 'Cannot allocate memory', 'out of memory']
+
+# entries shown in each ranking of the profile report
+PROFILE_TOP = 10
+
 REDIRECTED = os.fstat(0) != os.fstat(1)
 
 STATUS_CODE = {
@@ -44,6 +77,11 @@ STATUS_CODE = {
     'ScriptTestError': '!',
     'NoInterpreterError': '?',
     'FilenameMismatch': '-',
+    'CompilationError': 'c',
+    'OutputLimitExceeded': 'l',
+    'Cancelled': '_',
+    'MemoryLimitExceeded': 'm',
+    'CPULimitExceeded': 'u',
 
     # Python ERROR codes
     'AttributeError': 'a',
@@ -59,16 +97,6 @@ STATUS_CODE = {
 }
 
 
-class CutTimeOut(Exception): pass
-
-
-def alarm_handler(_1, _2):
-    raise CutTimeOut
-
-
-signal.signal(signal.SIGALRM, alarm_handler)
-
-
 def unpack_results(run_method):
 
     def wrapper(self, *args, **kwargs):
@@ -99,11 +127,90 @@ def parse_test_report(data):
     return summary, feedback
 
 
+def output_limits():
+    config = tst.get_config()
+    return config.get('output-limit', OUTPUT_LIMIT_DEFAULT), config.get('report-limit', REPORT_LIMIT_DEFAULT)
+
+
+def truncate(text, limit):
+    if not text or len(text) <= limit:
+        return text
+
+    return text[:limit] + f"\n[... {len(text) - limit} characters truncated]\n"
+
+
+def interpreter_command(filename):
+    config = tst.get_config()
+    if not config.get('run'):
+        # default is running through python
+        return PYTHON
+
+    # use run option
+    suffix = Path(filename).suffix[1:]
+    command = config['run'].get(suffix)
+    if isinstance(command, dict):
+        # compiled languages: {build: <build command>, run: <run command>}
+        return command.get('run')
+
+    return command
+
+
+def subject_limits():
+    # resource limits for subjects: tst.yaml/tst.json entries override the
+    # ones in config.yaml (test suites may still override both)
+    limits = dict(tst.get_config().get('limits') or {})
+    limits.update(tst.read_specification().get('limits') or {})
+    check_limits(limits, 'limits')
+    return limits
+
+
+def required_files():
+    # files in the current directory matching the spec require patterns
+    require = tst.read_specification()['require']
+    return [fn for fn in os.listdir() if any(fnmatch(fn, req) for req in require)]
+
+
+def check_limits(limits, where):
+    _assert(isinstance(limits, dict), f"{where} must be a map")
+    for name, value in limits.items():
+        _assert(name in LIMITS, f"unknown resource limit in {where}: {name} (use {', '.join(LIMITS)})")
+        _assert(type(value) is int and value > 0, f"{where}: {name} must be a positive integer")
+
+
+def start_forkserver():
+    command = interpreter_command('subject.py')
+    return command and ForkServer(shlex.split(command))
+
+
+def build_command(filename):
+    config = tst.get_config()
+    suffix = Path(filename).suffix[1:]
+    command = (config.get('run') or {}).get(suffix)
+    return command.get('build') if isinstance(command, dict) else None
+
+
+def cpu_ratio(result):
+    # cpu time over wall time of a run (None if unknown)
+    if not result.get('time') or result.get('user_time') is None:
+        return None
+
+    return (result['user_time'] + (result.get('sys_time') or 0)) / result['time']
+
+
+def attempt(result):
+    return {key: result.get(key) for key in ['status', 'time', 'user_time', 'sys_time', 'infrastructure_timeout']}
+
+
 class TestRun:
 
-    def __init__(self, subject, testcase):
+    def __init__(self, subject, testcase, forkserver=None, limits=None, scratch=None, required=()):
         self.subject = subject
         self.testcase = testcase
+        self.forkserver = forkserver
+        self.limits = limits or {}
+        self.scratch = scratch
+        self.required = required
+        self.cwd = None
         self.result = {}
         self.result['type'] = self.testcase.type
         fnmatch_options = testcase.fnmatch or ["*.py"]
@@ -115,6 +222,14 @@ class TestRun:
             self.result['summary'] = STATUS_CODE[self.result['status']]
             return self.result
 
+        if self.scratch is None:
+            return self._run(timeout)
+
+        # run in a private directory with just the files the test needs
+        with self.scratch.directory(self.staged_files()) as self.cwd:
+            return self._run(timeout)
+
+    def _run(self, timeout):
         if self.testcase.type == 'io':
             return self.run_iotest(timeout)
 
@@ -124,6 +239,49 @@ class TestRun:
         else:
             _assert(False, 'unknown test type')
 
+    def staged_files(self):
+        files = [self.subject.filename, *self.required]
+        if self.testcase.type == 'script':
+            # the test file itself and files named in its command
+            files.append(self.testcase.test_suite)
+            files.extend(arg for arg in shlex.split(self.testcase.script) if os.path.isfile(arg))
+            files.append('conftest.py')
+
+        return files
+
+    def exceeded_cpu_limit(self, child):
+        if 'cpu' not in self.limits:
+            return False
+
+        # SIGXCPU at the soft limit, SIGKILL if the subject ignores it
+        cpu_time = (child.get('user_time') or 0) + (child.get('sys_time') or 0)
+        return child['returncode'] == -signal.SIGXCPU or child['returncode'] == -signal.SIGKILL and cpu_time >= self.limits['cpu']
+
+    def record_usage(self, child):
+        self.result['time'] = child['time']
+        for resource in RESOURCES:
+            self.result[resource] = child.get(resource)
+
+        if child.get('timeout'):
+            ratio = cpu_ratio(self.result)
+            self.result['infrastructure_timeout'] = ratio is not None and ratio < STARVED_RATIO
+
+    def cache_key(self, cache, timeout):
+        # output limits decide between a result and OutputLimitExceeded
+        parts = [cache.digest(self.subject.filename), self.testcase.spec, self.testcase.fnmatch, timeout, output_limits()]
+
+        # files the test depends on: the required ones and, for script tests,
+        # the test suite, files named in the command (e.g. a checker) and
+        # conftest.py
+        depends = sorted({fn for fn in self.staged_files() if fn != self.subject.filename and os.path.isfile(fn)})
+        parts.append([(fn, cache.digest(fn)) for fn in depends])
+        if self.testcase.type != 'script':
+            parts.append(interpreter_command(self.subject.filename))
+            parts.append(build_command(self.subject.filename))
+            parts.append(self.limits)
+
+        return cache.key(*parts)
+
     @unpack_results
     def run_script(self, timeout=TIMEOUT_DEFAULT):
         if "{}" in self.testcase.script:
@@ -135,18 +293,30 @@ class TestRun:
 
         self.result['command'] = cmd_str
         stdout, stderr = None, None
-        process = Popen(command, stdout=PIPE, stderr=PIPE)
-        signal.alarm(10 * timeout)
+        output_limit, report_limit = output_limits()
         try:
-            stdout, stderr = map(to_unicode, process.communicate(timeout=timeout))
-            signal.alarm(0) # reset the alarm
-            process.wait()
-            assert process.returncode == 0, f"script test error: exit code = {process.returncode}"
+            child = run_process(command, timeout=timeout, stdout_limit=output_limit, stderr_limit=output_limit, cwd=self.cwd)
+            self.record_usage(child)
+            if child['timeout']:
+                # test script running too long: possibly a loop in the subject
+                self.result['status'] = 'Timeout'
+                self.result['summary'] = STATUS_CODE[self.result['status']]
+                return self.result
+
+            stdout, stderr = map(to_unicode, (child['stdout'], child['stderr']))
+            if child['output_limit']:
+                self.result['status'] = 'OutputLimitExceeded'
+                self.result['summary'] = STATUS_CODE[self.result['status']]
+                self.result['stdout'] = truncate(stdout, report_limit)
+                self.result['stderr'] = truncate(stderr, report_limit)
+                return self.result
+
+            assert child['returncode'] == 0, f"script test error: exit code = {child['returncode']}"
 
             # collect test data
-            self.result['exit_status'] = process.returncode
-            self.result['stderr'] = stderr # comment out to remove from report
-            self.result['stdout'] = stdout # comment out to remove from report
+            self.result['exit_status'] = child['returncode']
+            self.result['stderr'] = truncate(stderr, report_limit) # comment out to remove from report
+            self.result['stdout'] = truncate(stdout, report_limit) # comment out to remove from report
 
             # collect report from either stderr or stdout
             summary, feedback = parse_test_report(stderr)
@@ -162,18 +332,11 @@ class TestRun:
             self.result['status'] = 'ScriptTestError'
             self.result['summary'] = STATUS_CODE[self.result['status']]
             self.result['error'] = f'{e}'
-            self.result['stderr'] = stderr if stderr else None
-            self.result['stdout'] = stdout if stdout else None
+            self.result['stderr'] = truncate(stderr, report_limit) if stderr else None
+            self.result['stdout'] = truncate(stdout, report_limit) if stdout else None
             log.warning(f'test script error: CMD=`{cmd_str}` ERROR={e.__class__.__name__} MSG=`{e}`')
             return self.result
 
-        except (CutTimeOut, TimeoutExpired) as e:
-            # test script running too long: possibly a loop in the subject
-            process.terminate()
-            self.result['status'] = 'Timeout'
-            self.result['summary'] = STATUS_CODE[self.result['status']]
-            return self.result
-
         self.result['summary'] = summary
         if summary == len(summary) * '.':
             self.result['status'] = 'Success'
@@ -186,20 +349,22 @@ class TestRun:
     def run_iotest(self, timeout=TIMEOUT_DEFAULT):
 
         # define command
-        config = tst.get_config()
-        if config.get('run'):
-            # use run option
-            extensions = config['run'].keys()
-            suffix = Path(self.subject.filename).suffix[1:]
-            if suffix not in extensions:
-                self.result['status'] = 'NoInterpreterError'
+        command = interpreter_command(self.subject.filename)
+        if command is None:
+            self.result['status'] = 'NoInterpreterError'
+            return self.result
+
+        # compile subject (once for all tests) if a build is configured
+        build = build_command(self.subject.filename)
+        if build:
+            build_dir, error = tst.build.build(self.subject.filename, build)
+            if error is not None:
+                self.result['status'] = 'CompilationError'
+                self.result['stderr'] = error
                 return self.result
-            _assert(suffix in extensions, "\nfatal: missing command for extension %s" % suffix)
-            command = config['run'][suffix]
-            cmd_str = f'{command} "{self.subject.filename}"'
-        else:
-            # default is running through python
-            cmd_str = f'{PYTHON} "{self.subject.filename}"'
+            command = command.replace('{build}', shlex.quote(build_dir))
+
+        cmd_str = f'{command} "{self.subject.filename}"'
 
         command = shlex.split(cmd_str)
 
@@ -207,44 +372,63 @@ class TestRun:
         if self.testcase.input:
             input_data = self.testcase.input.encode('utf-8')
         else:
-            input_data = ''
+            input_data = b''
         self.result['input'] = self.testcase.input
         self.result['output'] = self.testcase.output
         self.result['match'] = self.testcase.match
 
+        # limit captured output: an exact output test fails anyway
+        # once the output is clearly longer than expected
+        output_limit, report_limit = output_limits()
+        stdout_limit = output_limit
+        if self.testcase.output is not None:
+            stdout_limit = min(output_limit, 2 * len(self.testcase.output.encode('utf-8')) + 4096)
+
         # run the test (loop until succeeding)
         while True:
-            process = Popen(command, stdin=PIPE, stdout=PIPE, stderr=PIPE)
-            signal.alarm(10 * timeout)
             try:
+                if self.forkserver and self.subject.filename.endswith('.py'):
+                    # fork subject from a warm interpreter
+                    child = self.forkserver.run(self.subject.filename, input_data, timeout, stdout_limit, output_limit, limits=self.limits, cwd=self.cwd)
+                else:
+                    # run subject as external process
+                    child = run_process(command, input_data=input_data, timeout=timeout, stdout_limit=stdout_limit, stderr_limit=output_limit, limits=self.limits, cwd=self.cwd)
+                break
 
-                # run subject as external process
-                process_data = process.communicate(input=input_data, timeout=timeout)
-                stdout, stderr = map(to_unicode, process_data)
+            except (FileNotFoundError, PermissionError):
+                if not self.forkserver:
+                    raise
+                self.forkserver = None
 
-                # collect output data
-                self.result['stdout'] = stdout # comment out to remove from report
-                self.result['stderr'] = stderr # comment out to remove from report
+            except OSError:
+                # external error... try running again (without fork server)!
+                self.forkserver = None
 
-                # reset alarm for future use
-                signal.alarm(0)
-                process.wait()
+        self.record_usage(child)
+        if child['timeout']:
+            # timeout... give up
+            self.result['status'] = 'Timeout'
+            return self.result
 
-                # leave loop
-                break
+        # collect output data
+        stdout, stderr = map(to_unicode, (child['stdout'], child['stderr']))
+        self.result['stdout'] = truncate(stdout, report_limit) # comment out to remove from report
+        self.result['stderr'] = truncate(stderr, report_limit) # comment out to remove from report
+        if child['output_limit']:
+            self.result['status'] = 'OutputLimitExceeded'
+            return self.result
 
-            except (CutTimeOut, TimeoutExpired) as e:
-                # timeout... give up
-                process.terminate()
-                self.result['status'] = 'Timeout'
-                return self.result
+        # check for ERROR during execution
+        if child['returncode'] != 0:
 
-            except OSError:
-                # external error... try running again!
-                process.terminate()
+            # killed by (or failing under) a resource limit
+            if self.exceeded_cpu_limit(child):
+                self.result['status'] = 'CPULimitExceeded'
+                return self.result
 
-        # check for ERROR during execution
-        if process.returncode != 0:
+            if 'memory' in self.limits and any(e in stderr for e in MEMORY_ERRORS):
+                self.result['status'] = 'MemoryLimitExceeded'
+                return self.result
 
             # set generic error status
             self.result['status'] = 'Error'
@@ -265,7 +449,7 @@ class TestRun:
         # check for partial (regex based) match
         if self.testcase.match:
             stdout_regex = stdout
-            if self.testcase.re.match(stdout_regex):
+            if self.testcase.matcher.match(stdout_regex):
                 self.result['status'] = 'Success'
                 return self.result
 
@@ -274,6 +458,64 @@ class TestRun:
         return self.result
 
 
+class BatchRun:
+
+    def __init__(self, testcase, testruns):
+        self.testcase = testcase
+        self.testruns = testruns
+
+    def _run_once(self, testruns, timeout):
+        subjects = [tr.subject.filename for tr in testruns]
+        command = [PYTHON, tst.batch.__file__, self.testcase.pytest_file, str(timeout), *subjects]
+        try:
+            child = run_process(command, timeout=timeout * len(subjects))
+        except OSError as e:
+            log.warning(f'batch script error: ERROR={e.__class__.__name__} MSG=`{e}`')
+            return []
+
+        reports = {}
+        for line in to_unicode(child['stdout']).splitlines():
+            try:
+                report = json.loads(line)
+                reports[report['subject']] = report
+            except (ValueError, KeyError, TypeError):
+                pass
+
+        reported = []
+        for testrun in testruns:
+            report = reports.get(testrun.subject.filename)
+            if report is None:
+                continue
+
+            testrun.result['command'] = self.testcase.script.format(testrun.subject.filename)
+            testrun.record_usage({'time': report.get('time'), 'user_time': report.get('user_time'), 'sys_time': report.get('sys_time')})
+            if report.get('timeout'):
+                testrun.result['status'] = 'Timeout'
+                testrun.result['summary'] = STATUS_CODE[testrun.result['status']]
+            else:
+                summary = report['summary']
+                testrun.result['summary'] = summary
+                testrun.result['feedback'] = report.get('feedback')
+                testrun.result['status'] = 'Success' if summary == len(summary) * '.' else 'Fail'
+            reported.append(testrun)
+
+        return reported
+
+    def run(self, timeout=TIMEOUT_DEFAULT):
+        # run the pytest file against all subjects in as few processes as
+        # possible; a subject that times out or crashes the batch interrupts
+        # it, so the batch is resumed with the subjects left without report
+        pending = [tr for tr in self.testruns if tr.result['fnmatch']]
+        while pending:
+            reported = self._run_once(pending, timeout)
+            if not reported:
+                break
+            pending = [tr for tr in pending if tr not in reported]
+
+        # those are left to be run individually
+        return pending
+
+
 class TestSubject:
 
     def __init__(self, filename):
@@ -321,17 +563,24 @@ class TestCase():
 
     def _preprocess_parts(self, spec):
         in_parts, out_parts = [], []
+        self.literals = []
         for part in spec['parts']:
             _assert(type(part) is dict, f"invalid io test (part is not an object): {self.id}")
             _assert(len(part) == 1, f"invalid io test (part has wrong length): {self.id}")
             if "out" in part:
                 out_parts.append(re.escape(str(part["out"])))
+                self.literals.append((str(part["out"]), False))
 
             elif "re" in part:
                 out_parts.append(str(part["re"]))
+                self.literals = None
 
             elif "tok" in part:
                 out_parts.append(r"\b" + str(part["tok"]) + r"\b")
+                if self.literals is not None and is_literal(str(part["tok"])):
+                    self.literals.append((str(part["tok"]), True))
+                else:
+                    self.literals = None
 
             elif "in" in part:
                 input_part = str(part["in"])
@@ -359,13 +608,16 @@ class TestCase():
         tokens = spec["tokens"] if type(spec["tokens"]) is list else spec["tokens"].split()
         _assert(all(type(tk) is str for tk in tokens), f"invalid io test (tokens must be strings): {self.id}"),
         match_value = ".*\\b" + "\\b.*\\b".join([re.escape(tk) for tk in tokens]) + "\\b.*"
+        self.literals = [(tk, True) for tk in tokens] or None
         return match_value
 
 
-    def __init__(self, spec, test_suite, level, index):
+    def __init__(self, spec, test_suite, level, index, limits=None):
         # identify test type and check validity
         self.id = f"{test_suite}::{index + 1}"
+        self.spec = spec
         self.test_suite = test_suite
+        self.limits = limits
         config = tst.get_config()
         self.fnmatch = spec.get('fnmatch') or [f"*.{k}" for k in config.get('run', {}).keys()]
         self.level = level
@@ -378,10 +630,12 @@ class TestCase():
             if self.type == 'script':
                 self._assert_script_spec_validity(spec)
                 self.script = spec.get('script') or spec.get('command')
+                self.pytest_file = spec.get('pytest')
 
             #case 'io':
             elif self.type == 'io':
                 self._assert_io_spec_validity(spec)
+                self.literals = None
                 self.ignore = spec.get('ignore', [])
                 if isinstance(self.ignore, str):
                     self.ignore = self.ignore.split()
@@ -414,29 +668,97 @@ class TestCase():
 
                 if self.match:
                     assert not self.output, "invariant violation"
-                    options = re.MULTILINE | re.DOTALL
-                    if 'case' in self.ignore:
-                        options = re.IGNORECASE | options
-                    self.re = re.compile(self.match, options)
+                    self._compile()
+
+    def _compile(self):
+        options = re.MULTILINE | re.DOTALL
+        if 'case' in self.ignore:
+            options = re.IGNORECASE | options
+        self.re = re.compile(self.match, options)
+
+        # ordered literals (tokens and plain parts) don't need
+        # the backtracking regex: use a linear scan instead
+        if self.literals is not None:
+            self.matcher = OrderedMatcher(self.literals, ignore_case='case' in self.ignore)
+        else:
+            self.matcher = self.re
 
+    def __getstate__(self):
+        # compiled regexes are not stored in the suite cache...
+        state = self.__dict__.copy()
+        state.pop('re', None)
+        state.pop('matcher', None)
+        return state
+
+    def __getattr__(self, name):
+        # ...they are rebuilt on first use after unpickling
+        if name in ['re', 'matcher'] and self.__dict__.get('match'):
+            self._compile()
+            return self.__dict__[name]
+
+        raise AttributeError(name)
 
-def get_options_from_cli_and_context(directory):
-    DEFAULT_TEST_SOURCES = ["*.yaml", "*.json", "test_*.py", "*_test.py"]
 
+def make_parser():
     parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument('-V', '--verbose', action="count", default=0, help='more verbose output')
     parser.add_argument('-q', '--quiet', action="store_true", default=False, help='suppress non-essential output')
     parser.add_argument('-T', '--timeout', type=int, default=TIMEOUT_DEFAULT, help='stop execution at TIMEOUT seconds')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='run at most JOBS tests concurrently (default: number of cpus)')
     parser.add_argument('-t', '--test-sources', nargs="+", default=[], help='read tests from TEST_SOURCES')
-    parser.add_argument('-f', '--output-format', type=str, choices=['default', 'json', 'brief', 'log'], help='choose report format')
+    parser.add_argument('-f', '--output-format', type=str, choices=['default', 'json', 'jsonl', 'brief', 'log'], help='choose report format')
     parser.add_argument('-d', '--diff', action="store_true", default=False, help='print diff output for failed io tests')
     parser.add_argument('-c', '--compare', action="store_true", default=False, help='shortcut for compare report format')
     parser.add_argument('-P', '--passed', action="store_true", default=False, help='suppress subjects that fail any test')
     parser.add_argument('-F', '--failed', action="store_true", default=False, help='suppress subjects that pass all tests')
+    parser.add_argument('--fail-fast', action="store_true", default=False, help='skip remaining tests of a subject after its first failure')
+    parser.add_argument('--batch', action="store_true", default=False, help='run pytest test files once for many subjects')
+    parser.add_argument('--fork-server', action="store_true", default=False, help='fork python subjects from a warm interpreter')
+    parser.add_argument('--no-cache', dest='cache', action="store_false", default=True, help='do not reuse nor store cached test results')
+    parser.add_argument('--retry-timeouts', action="store_true", default=False, help='run timed out tests again at the end, with less concurrency')
+    parser.add_argument('--adaptive', action="store_true", default=False, help='adjust concurrency to system load (up to JOBS tests)')
+    parser.add_argument('--isolate', action="store_true", default=False, help='run each test in its own temporary directory')
+    parser.add_argument('-w', '--watch', action="store_true", default=False, help='keep running tests affected by file changes')
+    parser.add_argument('--coordinator', metavar='[HOST:]PORT', help='grade subjects on `tst worker` processes connecting to PORT\n(anyone reaching PORT gets the tests and can send results: use --token)')
+    parser.add_argument('--token', default=os.environ.get('TST_TOKEN'), help='shared secret `tst worker` processes must present (default: $TST_TOKEN)')
+    parser.add_argument('--profile', action="store_true", default=False, help='report time and resources used by test cases and subjects')
+    parser.add_argument('-r', '--recursive', action="store_true", default=False, help='look for subjects in subdirectories too (files and directories matching the spec ignore patterns are skipped)')
     parser.add_argument('filenames', nargs='*', default=[])
+    return parser
+
+
+def default_options(**kwargs):
+    # options namespace for library use: as if tst was run with no arguments
+    options = make_parser().parse_args([])
+    options.quiet = True
+    options.output_format = 'json'
+    for key, value in kwargs.items():
+        if not hasattr(options, key):
+            raise TypeError(f"unknown option: {key}")
+        setattr(options, key, value)
+
+    return options
+
+
+DEFAULT_TEST_SOURCES = ["*.yaml", "*.json", "test_*.py", "*_test.py"]
+
+# specification files: a change in any of them reloads everything (watch mode)
+SPEC_FILES = ['tst.yaml', 'tst.json']
+
 
+def default_test_sources(directory):
+    test_sources = []
+    for pattern in DEFAULT_TEST_SOURCES:
+        test_sources.extend(fnfilter(directory, pattern))
+
+    return test_sources
+
+
+def get_options_from_cli_and_context(directory):
     # reuse argparse namespace as the options object
-    options = parser.parse_args()
+    options = make_parser().parse_args()
+
+    _assert(options.jobs > 0, "jobs must be a positive number")
 
     if options.compare:
         _assert(options.output_format in [None, "compare"], "output-format must be compare with --compare")
@@ -445,8 +767,16 @@ def get_options_from_cli_and_context(directory):
     # set default as default output_format
     options.output_format = options.output_format or 'default'
 
+    # in watch mode, files (and sources) not given are read again on changes
+    options.all_files = not options.filenames
+    options.all_test_sources = not options.test_sources
+
     # identify subjects to be tested/checked
-    if not options.filenames:
+    if not options.filenames and options.recursive:
+        # all files in directory and subdirectories are possible filenames
+        options.filenames = discover_files('.', tst.read_specification()['ignore'])
+
+    elif not options.filenames:
         # assume all files in directory to possible filenames
         options.filenames = directory
 
@@ -454,28 +784,43 @@ def get_options_from_cli_and_context(directory):
         # if a single filename is not a path: use it as wildcard
         options.filenames = fnfilter(directory, f'*{options.filenames[0]}*')
 
+    elif options.recursive:
+        # directories given stand for all files within them
+        ignore = tst.read_specification()['ignore']
+        options.filenames = [f for fn in options.filenames for f in (discover_files(fn, ignore) if os.path.isdir(fn) else [fn])]
+
     # set default test-sources if needed
     if not options.test_sources:
-        options.test_sources = []
-        for pattern in DEFAULT_TEST_SOURCES:
-            options.test_sources.extend(fnfilter(directory, pattern))
+        options.test_sources = default_test_sources(directory)
 
     return options
 
 
-def collect_test_cases(test_sources):
+def collect_test_cases(test_sources, use_cache=True):
     # collect tests...
     all_test_cases = []
 
+    # compiled suites are reused while files and run options don't change
+    suites = SuiteCache() if use_cache else None
+    run_options = sorted((tst.get_config().get('run') or {}).keys())
+
     ## collect yaml/json test suites and tests
     for tspath in test_sources:
         if all(not fnmatch(tspath, wc) for wc in ["*.json", "*.yaml"]): continue
+        test_cases = suites and suites.get(tspath, run_options)
+        if test_cases is not None:
+            all_test_cases.extend(test_cases)
+            continue
+
         try:
             # collect io test suite
             testsfile = JsonFile(tspath, array2map="tests")
             level = testsfile.get('level', 0)
-            test_cases = [TestCase(tc, tspath, level, index) for index, tc in enumerate(testsfile["tests"])]
+            limits = testsfile.get('limits')
+            limits is not None and check_limits(limits, f"{tspath}: limits")
+            test_cases = [TestCase(tc, tspath, level, index, limits) for index, tc in enumerate(testsfile["tests"])]
             all_test_cases.extend(test_cases)
+            suites and suites.put(tspath, test_cases, run_options)
 
         except tst.jsonfile.CorruptedJsonFile as e:
             cprint(YELLOW, f"invalid json/yaml: {tspath}")
@@ -492,6 +837,7 @@ def collect_test_cases(test_sources):
             testsfile = JsonFile(f".{tspath}-autotest.yaml")
             testsfile.data = {'tests': []}
             script_command = None
+            pytest_file = None
             if fnmatch(tspath, "*_tests.py"):
                 script_command = f'python {tspath} {{}}'
             if fnmatch(tspath, 'test_*.py') or \
@@ -499,110 +845,334 @@ def collect_test_cases(test_sources):
                     fnmatch(tspath, '*/test_*.py') or \
                     fnmatch(tspath, '_test_*.py'):
                 script_command = f'pytest {tspath} --tst {{}} --clean'
+                pytest_file = tspath
             if script_command:
-                testsfile.data['tests'].append({'type': 'script', 'script': script_command})
+                testsfile.data['tests'].append({'type': 'script', 'script': script_command, 'pytest': pytest_file})
                 test_cases = [TestCase(tc, tspath, 0, index) for index, tc in enumerate(testsfile["tests"])]
                 all_test_cases.extend(test_cases)
 
     return all_test_cases
 
 
-def run_tests_in_parallel(test_cases, test_suites, subjects, options):
+def compile_patterns(patterns):
+    # a single regex matching what any of the fnmatch patterns would
+    patterns = sorted({os.path.normcase(p) for p in patterns})
+    return re.compile('|'.join(fntranslate(p) for p in patterns) or '(?!)')
+
+
+def walk(directory='.', ignore=()):
+    # os.walk skipping hidden, __pycache__ and ignored directories
+    ignored = compile_patterns(ignore)
+    for root, dirs, filenames in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != '__pycache__' and not ignored.match(os.path.normcase(d)))
+        yield root, sorted(filenames)
+
+
+def discover_files(directory='.', ignore=()):
+    # files in directory and its subdirectories
+    return [os.path.normpath(os.path.join(root, fn)) for root, filenames in walk(directory, ignore) for fn in filenames]
+
+
+def select_subjects(filenames, test_cases, test_suites, ignore):
+    # every file is a potential subject, except for test suites and files
+    # matching some ignore pattern (by path or name). Test cases mostly share
+    # their fnmatch lists: all of them are checked at once by a single regex.
+    test_suites = set(test_suites)
+    accepted = compile_patterns({fm for fnmatch_list in {tuple(tc.fnmatch) for tc in test_cases} for fm in fnmatch_list})
+    ignored = compile_patterns(ignore)
+
+    subjects = set([])
+    for sub in filenames:
+        path = os.path.normcase(sub)
+        if sub in test_suites or ignored.match(path) or ignored.match(os.path.basename(path)):
+            continue
+        if accepted.match(path):
+            subjects.add(sub)
+
+    return subjects
+
+
+def run_tests_in_parallel(test_cases, test_suites, subjects, options, on_result=None, aggregator=None, forkserver=None):
     def results_reader(q):
-        # read queue
+        # read queue (until the None sentinel)
         while True:
             test_result = q.get()
+            if test_result is None:
+                q.task_done()
+                return
             test_result["_test_suite"] = test_result["_testrun"].testcase.test_suite
             test_result["_testcase"] = test_result["_testrun"].testcase
             test_result["subject"] = test_result["_testrun"].subject.filename
             all_tests_results.append(test_result)
-            q.task_done()
+            aggregator and aggregator.add(test_result)
+            if history and not test_result.get('cached') and test_result.get('status') != 'Cancelled':
+                history.record(test_result["_testcase"], test_result['summary'] != '.')
+            try:
+                on_result and on_result(test_result)
+            except Exception as e:
+                log.warning(f'result listener error: ERROR={e.__class__.__name__} MSG=`{e}`')
+            finally:
+                q.task_done()
             options.verbose > 2 and print(test_result['summary'], flush=True, end='', file=sys.stderr)
 
-    def test_runner(testrun, q):
-        options.verbose >= 2 and print(f"** starting test: {testrun.subject.filename} X {testrun.testcase.test_suite}")
-        testresult = testrun.run(timeout=options.timeout)
+    def lookup(testrun):
+        key = cache and testrun.result['fnmatch'] and testrun.cache_key(cache, options.timeout)
+        testresult = key and cache.get(key)
+        if testresult:
+            testresult['cached'] = True
+            testrun.result = testresult
+
+        return key, testresult
+
+    def publish(testrun, testresult, key):
+        # timeouts may be caused by overload: retry them at the end (unless
+        # the subject was clearly busy looping all along)
+        if retries is not None and testresult.get('status') == 'Timeout' and not hasattr(testrun, 'first_attempt'):
+            ratio = cpu_ratio(testresult)
+            if ratio is None or ratio < BUSY_RATIO:
+                with lock:
+                    retries.append(testrun)
+                return
+
+        if key and not testresult.get('cached') and testresult.get('status') not in UNCACHEABLE:
+            cache.put(key, testresult)
+
+        # time spent in the scheduler queue is not part of the cached result
+        testresult['wait'] = getattr(testrun, 'wait', None)
+        if hasattr(testrun, 'first_attempt'):
+            testresult['attempts'] = [testrun.first_attempt, attempt(testresult)]
+        if adaptive and not testresult.get('cached') and testresult.get('time') is not None:
+            adaptive.observe(testrun.testcase.id, testresult['time'], timeout=testresult.get('status') == 'Timeout')
         testresult["_testrun"] = testrun
         q.put(testresult)
 
-    def ui(q):
-        time.sleep(1)
-        number_test_runs = len(subjects) * len(test_cases)
-        done = len(all_tests_results)
+        # in fail-fast mode, the first failure of a subject cancels the rest
+        if options.fail_fast and not all(c == '.' for c in testresult['summary']):
+            cancel(testrun.subject.filename)
+
+    def cancel(subject):
+        with lock:
+            if subject in cancelled_subjects:
+                return
+            cancelled_subjects.add(subject)
+
+        for testrun in scheduler.cancel(lambda job: isinstance(job, TestRun) and job.subject.filename == subject):
+            testrun.result['status'] = 'Cancelled'
+            testrun.result['summary'] = STATUS_CODE[testrun.result['status']]
+            publish(testrun, testrun.result, None)
+
+    def test_runner(testrun):
+        options.verbose >= 2 and print(f"** starting test: {testrun.subject.filename} X {testrun.testcase.test_suite}")
+        testrun.wait = time.monotonic() - testrun.queued
+        key, testresult = lookup(testrun)
+        testresult = testresult or testrun.run(timeout=options.timeout)
+        publish(testrun, testresult, key)
+
+    def batch_runner(batchrun):
+        options.verbose >= 2 and print(f"** starting batch: {len(batchrun.testruns)} subjects X {batchrun.testcase.test_suite}")
+        keys = {}
+        wait = time.monotonic() - batchrun.queued
+        for testrun in batchrun.testruns:
+            testrun.wait = wait
+            keys[testrun], testresult = lookup(testrun)
+            testresult and publish(testrun, testresult, keys[testrun])
+
+        batchrun.testruns = [tr for tr in batchrun.testruns if not tr.result.get('cached')]
+        left = batchrun.run(timeout=options.timeout)
+        for testrun in batchrun.testruns:
+            testresult = testrun.run(timeout=options.timeout) if testrun in left or not testrun.result['fnmatch'] else testrun.result
+            publish(testrun, testresult, keys[testrun])
+
+    def retry_runner(testrun):
+        retry = TestRun(testrun.subject, testrun.testcase, forkserver=testrun.forkserver, limits=testrun.limits, scratch=testrun.scratch, required=testrun.required)
+        retry.first_attempt = attempt(testrun.result)
+        retry.wait = time.monotonic() - testrun.queued
+        key = cache and retry.cache_key(cache, options.timeout)
+        publish(retry, retry.run(timeout=options.timeout), key)
+
+    def runner(job):
+        if isinstance(job, BatchRun):
+            batch_runner(job)
+        else:
+            test_runner(job)
+
+    def submit(job):
+        job.queued = time.monotonic()
+        scheduler.submit(job)
+
+    def adapt(adaptive):
+        while not finished.wait(1):
+            limit, reason = adaptive.adjust()
+            if reason:
+                options.verbose and print(f"* running at most {limit} tests at once ({reason})", file=sys.stderr)
+                log.info(f'concurrency limit set to {limit}: {reason}')
+
+    def ui(scheduler):
+        if finished.wait(1):
+            return
+        number_test_runs = scheduler.submitted
+        queued, running, done = scheduler.counts()
         if done > number_test_runs / 2:
             return
 
-        options.verbose >= 0 and print(f"* {number_test_runs} tests threads started (this might take some time)", file=sys.stderr)
-        while True:
-            done = len(all_tests_results)
-            togo = number_test_runs - len(all_tests_results)
-            options.verbose and print(f"* {togo} threads still running", file=sys.stderr, flush=True)
-            time.sleep(3)
+        options.verbose >= 0 and print(f"* {number_test_runs} test runs scheduled on {scheduler.jobs} workers (this might take some time)", file=sys.stderr)
+        while not finished.wait(3):
+            queued, running, done = scheduler.counts()
+            options.verbose and print(f"* {queued} queued, {running} running, {done} done", file=sys.stderr, flush=True)
 
     # main run_tests_in_parallel
     all_tests_results = []
     t0 = time.time()
 
+    # reuse results of unchanged subjects and test cases
+    cache = options.cache and ResultCache()
+    history = options.fail_fast and FailureHistory() or None
+    lock = threading.Lock()
+    cancelled_subjects = set()
+    retries = [] if options.retry_timeouts else None
+
+    # resource limits of each test case's subjects
+    default_limits = subject_limits()
+    options.verbose and default_limits and print(f"* resource limits: {default_limits}", file=sys.stderr)
+    limits = {tc: {**default_limits, **(tc.limits or {})} for tc in test_cases if tc.type == 'io'}
+
+    # files required by the spec (part of cache keys and staged with --isolate)
+    required = required_files()
+
+    # each test run may get its own directory (with the required files)
+    scratch = options.isolate and ScratchDirs() or None
+    if scratch:
+        options.verbose and print(f"* running tests in private directories at {scratch.base}", file=sys.stderr)
+
+    # python subjects may be forked from a warm interpreter (the caller may
+    # provide one that outlives this run)
+    own_forkserver = forkserver is None and options.fork_server and start_forkserver()
+    forkserver = forkserver or own_forkserver
+    options.verbose and forkserver and print(f"* using fork server", file=sys.stderr)
+
     # start reader thread
     options.verbose and print(f"* starting results reader thread", file=sys.stderr)
     q = queue.Queue()
-    threading.Thread(target=results_reader, daemon=True, args=(q, )).start()
-    options.quiet or threading.Thread(target=ui, daemon=True, args=(q, )).start()
-
-    # run tests threads
-    options.verbose and print(f"* starting test threads", file=sys.stderr)
-    threads = []
-    subject_threads = []
-    last_subject = None
-    for subject, testcase in itertools.product(subjects, test_cases):
-        testrun = TestRun(TestSubject(subject), testcase)
-        test_thread = threading.Thread(target=test_runner, args=(testrun, q))
-        threads.append(test_thread)
-        subject_threads.append(test_thread)
-        if subject != last_subject:
-            for t in subject_threads: t.start()
-            subject_threads = []
-        last_subject = subject
-    else:
-        for t in subject_threads: t.start()
-
-    for t in threads: t.join()
-    options.verbose and print(f"* all test threads finished", file=sys.stderr)
+    reader = threading.Thread(target=results_reader, daemon=True, args=(q, ))
+    reader.start()
+
+    # queue all test runs and let a bounded pool of workers run them
+    options.verbose and print(f"* starting {options.jobs} test workers", file=sys.stderr)
+    scheduler = Scheduler(runner, jobs=options.jobs)
+    finished = threading.Event()
+    adaptive = options.adaptive and AdaptiveLimit(scheduler)
+    adaptive and threading.Thread(target=adapt, daemon=True, args=(adaptive, )).start()
+    batched = [tc for tc in test_cases if options.batch and tc.type == 'script' and tc.pytest_file]
+    ordered = test_cases
+    if options.fail_fast:
+        # likely failures first: they cancel the remaining tests of the subject
+        ordered = sorted(test_cases, key=lambda tc: (tc.level, -history.rate(tc)))
+
+    for subject, testcase in itertools.product(subjects, ordered):
+        if testcase not in batched:
+            submit(TestRun(TestSubject(subject), testcase, forkserver=forkserver, limits=limits.get(testcase), scratch=scratch, required=required))
+
+    # pytest files run once per batch of subjects (keeping all workers busy)
+    for testcase in batched:
+        testruns = [TestRun(TestSubject(subject), testcase, required=required) for subject in subjects]
+        size = max(1, min(BATCH_SIZE, -(-len(testruns) // options.jobs)))
+        for i in range(0, len(testruns), size):
+            submit(BatchRun(testcase, testruns[i:i + size]))
+
+    scheduler.start()
+    options.quiet or threading.Thread(target=ui, daemon=True, args=(scheduler, )).start()
+    scheduler.join()
+    finished.set()
+
+    # timed out runs are retried with less concurrency (and less contention)
+    if retries:
+        jobs = max(1, min(options.jobs // 4, (os.cpu_count() or 1) // 2))
+        options.verbose and print(f"* retrying {len(retries)} timed out test runs on {jobs} workers", file=sys.stderr)
+        scheduler = Scheduler(retry_runner, jobs=jobs)
+        for testrun in retries:
+            submit(testrun)
+        scheduler.start()
+        scheduler.join()
+    own_forkserver and own_forkserver.close()
+    if scratch:
+        options.verbose and print(f"* files staged: {scratch.staged}", file=sys.stderr)
+        scratch.close()
+    options.verbose and print(f"* all test workers finished", file=sys.stderr)
     q.join()
+    q.put(None)
+    reader.join()
     options.verbose and print(f"* results reader thread finished", file=sys.stderr)
 
+    history and history.save()
+    if cache:
+        options.verbose and print(f"* {cache.hits} cached results reused, {cache.stored} stored", file=sys.stderr)
+        cache.stored and cache.evict()
+    tst.build.built and tst.build.evict()
+
     return all_tests_results
 
 
 # begin: module reports
-def results_to_map(all_tests_results, test_suites, test_cases):
-    results = {}
+class ResultsAggregator:
+
+    def __init__(self, test_suites, test_cases):
+        self.test_suites = test_suites
+        self.summaries_sizes = {ts: 0 for ts in test_suites}
+        for tc in test_cases:
+            self.summaries_sizes[tc.test_suite] += 1
+        self.subjects = {}
+
+    def add(self, tr):
+        # O(1) per result: summaries and failures are kept as results arrive
+        subject_results = self.subjects.get(tr['subject'])
+        if subject_results is None:
+            subject_results = { ts: ['#'] * self.summaries_sizes[ts] for ts in self.test_suites }
+            subject_results['_failed'] = []
+            subject_results['_profile'] = {'runs': 0, 'cached': 0, 'time': 0.0, 'user_time': 0.0, 'sys_time': 0.0, 'maxrss': 0, 'wait': 0.0}
+            self.subjects[tr['subject']] = subject_results
 
-    summaries_sizes = {}
-    for ts in test_suites:
-        summaries_sizes[ts] = sum(1 for tc in test_cases if tc.test_suite == ts)
+        subject_results[tr['_test_suite']][tr['_testcase'].index] = tr['summary']
+        if tr['summary'] != '.':
+            subject_results['_failed'].append(tr)
+
+        # resources used by the subject (cached results didn't run this time)
+        profile = subject_results['_profile']
+        profile['runs'] += 1
+        profile['wait'] += tr.get('wait') or 0
+        if tr.get('cached'):
+            profile['cached'] += 1
+            return
 
-    for tr in all_tests_results:
-        if not tr['subject'] in results:
-            summaries = { ts: ['#'] * summaries_sizes[ts] for ts in test_suites }
-            failed = [_tr for _tr in all_tests_results if _tr['summary'] != '.' and _tr['subject'] == tr['subject']]
-            summaries['_failed'] = failed
-            results[tr['subject']] = summaries
+        profile['time'] += tr.get('time') or 0
+        profile['user_time'] += tr.get('user_time') or 0
+        profile['sys_time'] += tr.get('sys_time') or 0
+        profile['maxrss'] = max(profile['maxrss'], tr.get('maxrss') or 0)
 
-        subject_results = results[tr['subject']]
-        subject_results[tr['_test_suite']][tr['_testcase'].index] = tr['summary']
+    def results(self):
+        results = {}
+        for sub, subject_results in self.subjects.items():
+            results[sub] = { ts: "".join(subject_results[ts]) for ts in self.test_suites }
+            results[sub]['_failed'] = list(subject_results['_failed'])
+            results[sub]['_profile'] = {k: round(v, 3) for k, v in subject_results['_profile'].items()}
 
-    for sub in results.keys():
-        for ts in test_suites:
-            results[sub][ts] = "".join(summary for summary in results[sub][ts])
+        return results
+
+
+def results_to_map(all_tests_results, test_suites, test_cases):
+    aggregator = ResultsAggregator(test_suites, test_cases)
+    for tr in all_tests_results:
+        aggregator.add(tr)
 
-    return results
+    return aggregator.results()
 
 
 def print_json_report(results, test_suites, test_cases, options):
     to_pop = []
     for sub, res in results.items():
         failed = res.pop("_failed", None)
+        profile = res.pop("_profile", None)
+        if options.profile:
+            res['profile'] = profile
         if options.passed and failed:
             to_pop.append(sub)
         elif options.failed and not failed:
@@ -614,6 +1184,25 @@ def print_json_report(results, test_suites, test_cases, options):
     print(json.dumps(results))
 
 
+def print_jsonl_result(test_result, profile=False):
+    line = {
+        "subject": test_result["subject"],
+        "test_suite": test_result["_test_suite"],
+        "test_case": test_result["_testcase"].index + 1,
+        "summary": test_result["summary"],
+        "status": test_result.get("status"),
+    }
+    if profile:
+        for key in ['time', 'wait', *RESOURCES, 'cached']:
+            line[key] = test_result.get(key)
+    if test_result.get('infrastructure_timeout'):
+        line['infrastructure_timeout'] = True
+    if test_result.get('attempts'):
+        line['attempts'] = test_result['attempts']
+
+    print(json.dumps(line), flush=True)
+
+
 def print_cli_report(results, subjects, test_suites, test_cases, options, total_time):
     def indent(text):
         _assert(not text or text[-1] == '\n', "indent deve ser chamada apenas para text terminado em newlines")
@@ -632,18 +1221,20 @@ def print_cli_report(results, subjects, test_suites, test_cases, options, total_
         if 'stdout' not in result:
             return None
 
-        differ = difflib.Differ()
-        diff = differ.compare(result['stdout'].splitlines(True), result['output'].splitlines(True))
+        diff = tst.diff.compare(result['stdout'].splitlines(True), result['output'].splitlines(True))
         lines = []
         for e in diff:
+            e = e.rstrip('\n')
             if e[0] == '+':
-                line = color(LGREEN, "+ ") + color('\033[1;32;100m', e[2:-1]) + '\n'
+                line = color(LGREEN, "+ ") + color('\033[1;32;100m', e[2:]) + '\n'
             elif e[0] == '-':
-                line = color(LRED, "- ") + color('\033[1;31;100m', e[2:-1]) + '\n'
+                line = color(LRED, "- ") + color('\033[1;31;100m', e[2:]) + '\n'
             elif e[0] == '?':
-                line = color('\033[2m', e[:-1]) + '\n'
+                line = color('\033[2m', e) + '\n'
+            elif e[0] == '!':
+                line = color(YELLOW, e) + '\n'
             else:
-                line = e
+                line = e + '\n'
             lines.append(line)
         return "".join(lines)
 
@@ -669,8 +1260,11 @@ def print_cli_report(results, subjects, test_suites, test_cases, options, total_
             for tr in results[fn]['_failed']:
                 testcase = f"-- {tr['_testcase'].test_suite}::{tr['_testcase'].index + 1}"
                 print(color(YELLOW, testcase) + f" ({tr.get('status')})")
-                if tr['type'] == 'io' and not tr['match'] and tr.get('summary') not in "et":
-                    print(indent(internal_diff(tr)))
+                if tr.get('status') in ['Cancelled', 'FilenameMismatch']:
+                    continue # never ran: nothing to compare
+                if tr['type'] == 'io' and not tr.get('match', True) and tr.get('summary') not in "et":
+                    diff = internal_diff(tr)
+                    diff and print(indent(diff))
 
     # add meta data to report if required
     if options.quiet: return
@@ -689,6 +1283,12 @@ def print_cli_report(results, subjects, test_suites, test_cases, options, total_
     print(f"{total_time:.2f}s", end='', file=sys.stderr)
     print(f" ({1000 * (total_time / len(results)):.1f} ms/test)" if subjects else " (-.- ms/test)", file=sys.stderr)
 
+    # line 4: timeouts that look like overload (if any)
+    starved = sum(1 for fn in results for tr in results[fn]['_failed'] if tr.get('infrastructure_timeout'))
+    if starved:
+        hint = "even when retried" if options.retry_timeouts else "try --retry-timeouts or fewer --jobs"
+        print(f"{starved} timeouts got little cpu time: machine overloaded? ({hint})", file=sys.stderr)
+
 
 def print_log_report(results, subjects, test_suites, test_cases, options, total_time):
     import hashlib
@@ -703,9 +1303,13 @@ def print_log_report(results, subjects, test_suites, test_cases, options, total_
         if 't' in summaries:
             brief_summary = 'timeout'
         path = Path.cwd() / fn
-        hash_digest = hashlib.md5(open(path,'rb').read()).hexdigest()
+        hash_digest = file_digest(path)
         timestamp = dt.now().isoformat()[:19]
-        print(f"{timestamp} {hash_digest} {brief_summary} {path} {all_summaries}")
+        resources = ""
+        if options.profile:
+            profile = results[fn]['_profile']
+            resources = f" time={profile['time']:.3f}s cpu={profile['user_time'] + profile['sys_time']:.3f}s maxrss={profile['maxrss']}k"
+        print(f"{timestamp} {hash_digest} {brief_summary} {path} {all_summaries}{resources}")
     if not subjects:
         timestamp = dt.now().isoformat()[:19]
         hash_digest = hashlib.md5(b"").hexdigest()
@@ -747,6 +1351,38 @@ def print_brief_report(results, subjects, test_suites, test_cases, options, tota
     print(f"{total_time:.2f}s", end='', file=sys.stderr)
     print(f" ({1000 * (total_time / len(results)):.1f} ms/test)" if subjects else " (-.- ms/test)", file=sys.stderr)
 
+def print_profile_report(all_tests_results, options, total_time):
+    # where did grading time go? (printed to stderr, after the report)
+    executed = [tr for tr in all_tests_results if not tr.get('cached') and tr.get('time') is not None]
+    cached = sum(1 for tr in all_tests_results if tr.get('cached'))
+    execution = sum(tr['time'] for tr in executed)
+    cpu = sum((tr.get('user_time') or 0) + (tr.get('sys_time') or 0) for tr in executed)
+    wait = sum(tr.get('wait') or 0 for tr in all_tests_results)
+
+    cases, subjects = {}, {}
+    for tr in executed:
+        case = cases.setdefault(tr['_testcase'].id, [0, 0.0])
+        case[0] += 1
+        case[1] += tr['time']
+        subject = subjects.setdefault(tr['subject'], [0, 0.0, 0])
+        subject[0] += 1
+        subject[1] += tr['time']
+        subject[2] = max(subject[2], tr.get('maxrss') or 0)
+
+    print("--- profile", file=sys.stderr)
+    print(f"{len(all_tests_results)} test runs: {len(executed)} executed, {cached} cached", file=sys.stderr)
+    print(f"wall time {total_time:.2f}s on {options.jobs} workers: {execution:.2f}s executing (cpu {cpu:.2f}s), {wait:.2f}s queued", file=sys.stderr)
+    if executed:
+        print(f"mean per test run: {1000 * execution / len(executed):.1f} ms executing, {1000 * wait / len(all_tests_results):.1f} ms queued", file=sys.stderr)
+
+    cases and print("slowest test cases:", file=sys.stderr)
+    for id, (runs, seconds) in sorted(cases.items(), key=lambda e: -e[1][1])[:PROFILE_TOP]:
+        print(f"  {seconds:8.3f}s  {id} ({runs} runs, {1000 * seconds / runs:.1f} ms/run)", file=sys.stderr)
+
+    subjects and print("slowest subjects:", file=sys.stderr)
+    for fn, (runs, seconds, maxrss) in sorted(subjects.items(), key=lambda e: -e[1][1])[:PROFILE_TOP]:
+        print(f"  {seconds:8.3f}s  {fn} ({runs} runs, maxrss {maxrss}k)", file=sys.stderr)
+
 # end: module reports
 
 
@@ -765,29 +1401,48 @@ def main():
 
     # collect test suites and test cases
     options.verbose and print("* collecting test cases", file=sys.stderr)
-    test_cases = collect_test_cases(options.test_sources)
+    test_cases = collect_test_cases(options.test_sources, use_cache=options.cache)
     test_suites = list({tc.test_suite for tc in test_cases})
 
-    # every file is a potential subject, except for test suites
-    possible_subjects = [sub for sub in options.filenames if sub not in test_suites]
-
     # only files matching some test fnmatch property are valid subjects
     options.verbose and print("* collecting subjects matching test cases fnmatch", file=sys.stderr)
-    subjects = set([])
-    for sub, tc in itertools.product(possible_subjects, test_cases):
-        if sub not in spec['ignore'] and any(fnmatch(sub, fm) for fm in tc.fnmatch):
-            subjects.add(sub)
+    subjects = select_subjects(options.filenames, test_cases, test_suites, spec['ignore'])
+
+    # hash subjects once, in parallel (reused by the cache and the reports)
+    fingerprints().update(subjects)
+    options.verbose and print(f"* subjects hashed: {fingerprints().hashed} of {len(subjects)}", file=sys.stderr)
 
     t0 = time.time()
-    all_tests_results = run_tests_in_parallel(test_cases, test_suites, subjects, options)
-    results = results_to_map(all_tests_results, test_suites, test_cases)
+    on_result = None
+    if options.output_format == 'jsonl':
+        on_result = lambda test_result: print_jsonl_result(test_result, profile=options.profile)
+    aggregator = ResultsAggregator(test_suites, test_cases)
+    if options.coordinator:
+        from tst.distributed import run_distributed
+        all_tests_results = run_distributed(test_cases, test_suites, subjects, options, on_result=on_result, aggregator=aggregator)
+    else:
+        all_tests_results = run_tests_in_parallel(test_cases, test_suites, subjects, options, on_result=on_result, aggregator=aggregator)
+    results = aggregator.results()
     t1 = time.time()
+    print_report(results, subjects, test_suites, test_cases, options, t1 - t0)
+    options.profile and print_profile_report(all_tests_results, options, t1 - t0)
+
+    if options.watch:
+        sys.stdout.flush()
+        watch(spec, options, test_cases, subjects, all_tests_results, on_result)
+
+
+def print_report(results, subjects, test_suites, test_cases, options, total_time):
+    t0, t1 = 0, total_time
 
     #match options.output_format:
     if True:
         #case 'json':
         if options.output_format == 'json':
             print_json_report(results, test_suites, test_cases, options)
+        #case 'jsonl':
+        elif options.output_format == 'jsonl':
+            pass # results were streamed as they finished
         #case _:
         elif options.output_format == 'brief':
             print_brief_report(results, subjects, test_suites, test_cases, options, t1 - t0)
@@ -797,9 +1452,126 @@ def main():
            print_cli_report(results, subjects, test_suites, test_cases, options, t1 - t0)
 
 
+def watch(spec, options, test_cases, subjects, all_tests_results, on_result=None):
+    # Keeps suites and results in memory and re-runs only what a change
+    # affects: all tests of a changed subject and all subjects of a changed
+    # suite. Changing tst.yaml/tst.json starts over.
+    from tst.watch import Watcher
+
+    def key(tr):
+        return tr['subject'], tr['_test_suite'], tr['_testcase'].index
+
+    def report_error(e, what):
+        # a half edited file must not end the session (_assert has already
+        # shown its message)
+        isinstance(e, TstExit) or cprint(LRED, f"{what}: {e.__class__.__name__}: {e}")
+        log.warning(f'watch error: {what} ERROR={e.__class__.__name__} MSG=`{e}`')
+        options.quiet or print(f"* still watching for changes", file=sys.stderr, flush=True)
+
+    def follow(filenames):
+        # subjects may live in subdirectories
+        for directory in {os.path.dirname(fn) for fn in filenames}:
+            directory and watcher.add(directory)
+
+    def discover(ignore):
+        # discover_files, watching each directory visited (even empty ones)
+        filenames = []
+        for root, names in walk('.', ignore):
+            watcher.add(root)
+            filenames.extend(os.path.normpath(os.path.join(root, fn)) for fn in names)
+        return filenames
+
+    def run(cases, subjects):
+        if not cases or not subjects:
+            return
+        run_suites = list(dict.fromkeys(tc.test_suite for tc in cases))
+        for tr in run_tests_in_parallel(cases, run_suites, subjects, options, on_result=on_result, forkserver=forkserver):
+            latest[key(tr)] = tr
+
+    latest = {key(tr): tr for tr in all_tests_results}
+    known_sources = set(options.test_sources)
+    suites = {}
+    for tc in test_cases:
+        suites.setdefault(tc.test_suite, []).append(tc)
+
+    forkserver = options.fork_server and start_forkserver() or None
+    watcher = Watcher('.')
+    follow(options.filenames)
+    options.all_files and options.recursive and discover(spec['ignore'])
+    options.quiet or print(f"* watching for changes (^C to stop)", file=sys.stderr, flush=True)
+    try:
+        while True:
+            changed = watcher.changes()
+            if any(fn in SPEC_FILES for fn in changed):
+                try:
+                    spec = tst.read_specification()
+                except (SystemExit, Exception) as e:
+                    report_error(e, 'invalid specification')
+                    continue
+                changed = set(os.listdir()) | set(suites)
+                known_sources = set()
+
+            directory = os.listdir()
+            filenames = options.filenames
+            if options.all_files:
+                filenames = discover(spec['ignore']) if options.recursive else directory
+            follow(filenames)
+            test_sources = default_test_sources(directory) if options.all_test_sources else options.test_sources
+
+            # yaml/json suites created or changed are parsed again (pytest
+            # files have nothing to parse: their cases are just run again)
+            to_collect = [ts for ts in test_sources if fnmatch(ts, '*.yaml') or fnmatch(ts, '*.json')]
+            to_collect = [ts for ts in to_collect if ts in changed or ts not in known_sources]
+            removed = [ts for ts in suites if ts not in test_sources or not os.path.exists(ts)]
+            for ts in removed + to_collect:
+                suites.pop(ts, None)
+            for ts in to_collect:
+                try:
+                    cases = os.path.exists(ts) and collect_test_cases([ts], use_cache=options.cache)
+                except (SystemExit, Exception) as e:
+                    # left out until it is saved again
+                    report_error(e, f'invalid test suite {ts}')
+                    continue
+                if cases:
+                    suites[ts] = cases
+            known_sources = set(test_sources)
+            changed_suites = set(removed) | {ts for ts in suites if ts in changed}
+            latest = {k: tr for k, tr in latest.items() if k[1] in suites and k[1] not in changed_suites}
+
+            test_cases = [tc for cases in suites.values() for tc in cases]
+            test_suites = list(suites)
+            new_subjects = select_subjects(filenames, test_cases, test_suites, spec['ignore'])
+            changed_subjects = {sub for sub in new_subjects if sub in changed or sub not in subjects}
+            latest = {k: tr for k, tr in latest.items() if k[0] in new_subjects and k[0] not in changed_subjects}
+            removed_subjects = subjects - new_subjects
+            subjects = new_subjects
+            if not changed_suites and not changed_subjects and not removed_subjects:
+                continue
+
+            # run the affected tests
+            options.quiet or print(f"--- {time.strftime('%H:%M:%S')} changed: {' '.join(sorted(changed_suites | changed_subjects | removed_subjects))}", file=sys.stderr, flush=True)
+            t0 = time.time()
+            try:
+                run([tc for tc in test_cases if tc.test_suite in changed_suites], subjects - changed_subjects)
+                run(test_cases, changed_subjects)
+            except (SystemExit, Exception) as e:
+                report_error(e, 'error running tests')
+                continue
+            t1 = time.time()
+
+            results = results_to_map(latest.values(), test_suites, test_cases)
+            print_report(results, subjects, test_suites, test_cases, options, t1 - t0)
+            sys.stdout.flush()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        watcher.close()
+        forkserver and forkserver.close()
+
+
 log = logging.getLogger('tst-test')
 log.setLevel(logging.DEBUG)
-handler_file = logging.FileHandler(os.path.expanduser('~/.tst/logs'))
-handler_file.setFormatter(logging.Formatter('%(asctime)s|%(name)s|%(levelname)s|%(message)s'))
-log.addHandler(handler_file)
+log.addHandler(log_handler())
 log.info(f"CWD={os.getcwd()}")
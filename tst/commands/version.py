@@ -1,19 +1,25 @@
 import os
 import sys
-import requests
-import pkg_resources
-from cachecontrol import CacheControl
-from cachecontrol.caches.file_cache import FileCache
+from importlib.metadata import version, PackageNotFoundError
 
 from tst.utils import cprint
 from tst.colors import *
 
 def main():
-    current = pkg_resources.get_distribution('tst').version
+    try:
+        current = version('tst')
+    except PackageNotFoundError:
+        current = 'unknown'
+
     if not sys.stdout.isatty():
         print(current)
         return
 
+    # network modules are only needed (and imported) for interactive use
+    import requests
+    from cachecontrol import CacheControl
+    from cachecontrol.caches.file_cache import FileCache
+
     cprint(WHITE, current, file=sys.stdout)
     try:
         s = requests.session()
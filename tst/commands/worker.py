@@ -0,0 +1,42 @@
+# tst worker
+#
+# Grades subjects for a coordinator (`tst --coordinator PORT`), see
+# tst/distributed.py. Several workers may run on the same machine.
+
+import os
+import sys
+import time
+import argparse
+
+from tst.colors import *
+from tst.utils import cprint
+
+RETRY_INTERVAL = 2 # seconds between attempts to reach the coordinator
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='tst worker')
+    parser.add_argument('address', metavar='HOST:PORT', help='address of the coordinator')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='run at most JOBS tests concurrently (default: number of cpus)')
+    parser.add_argument('--fork-server', action="store_true", default=False, help='fork python subjects from a warm interpreter')
+    parser.add_argument('--no-cache', dest='cache', action="store_false", default=True, help='do not reuse nor store cached test results')
+    parser.add_argument('--wait', action="store_true", default=False, help='keep trying until the coordinator is up')
+    parser.add_argument('--token', default=os.environ.get('TST_TOKEN'), help='shared secret of the coordinator (default: $TST_TOKEN)')
+    options = parser.parse_args(sys.argv[2:])
+
+    from tst.distributed import work
+    while True:
+        try:
+            work(options.address, jobs=options.jobs, fork_server=options.fork_server, cache=options.cache, token=options.token)
+            break
+        except ConnectionRefusedError:
+            if not options.wait:
+                cprint(LRED, f"tst worker: no coordinator at {options.address}")
+                sys.exit(1)
+            time.sleep(RETRY_INTERVAL)
+        except ValueError as e:
+            # invalid data from the coordinator (already told so) or wrong token
+            cprint(LRED, f"tst worker: {e}")
+            sys.exit(1)
+
+    cprint(LGREEN, "tst worker: all subjects graded")
@@ -0,0 +1,124 @@
+import difflib
+
+# steps of the diff algorithm allowed per comparison (beyond that, the
+# report shows the differing block as is and says the diff was truncated)
+MAX_WORK = 1000000
+
+# intraline (?) hints are computed only for hunks this small
+INTRALINE_LINES = 4
+INTRALINE_WIDTH = 200
+
+# lines of each side shown when the diff is truncated
+TRUNCATED_LINES = 20
+
+
+def myers(a, b, max_work=MAX_WORK):
+    # Shortest edit script from a to b (Myers' O((N+M)D) algorithm). Returns
+    # a list of (tag, i, j) with tag ' ' (a[i] == b[j]), '-' (a[i] removed)
+    # or '+' (b[j] added), or None if it takes more than max_work steps.
+    n, m = len(a), len(b)
+    v = {1: 0}
+    trace = []
+    work = 0
+    for d in range(n + m + 1):
+        trace.append(v.copy())
+        work += d
+        for k in range(-d, d + 1, 2):
+            if k == -d or k != d and v[k - 1] < v[k + 1]:
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            x0 = x
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            work += x - x0 + 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+
+        if work > max_work:
+            return None
+
+
+def _backtrack(trace, n, m):
+    ops = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or k != d and v[k - 1] < v[k + 1]:
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x, y = x - 1, y - 1
+            ops.append((' ', x, y))
+        if d > 0:
+            ops.append(('+', x, prev_y) if x == prev_x else ('-', prev_x, y))
+        x, y = prev_x, prev_y
+
+    ops.reverse()
+    return ops
+
+
+def _hunk(removed, added):
+    # a block of changed lines, as difflib.Differ would show it (with
+    # intraline hints only when the block is small enough to be cheap)
+    small = len(removed) <= INTRALINE_LINES and len(added) <= INTRALINE_LINES
+    if small and all(len(line) <= INTRALINE_WIDTH for line in removed + added):
+        yield from difflib.Differ().compare(removed, added)
+        return
+
+    for line in removed:
+        yield '- ' + line
+    for line in added:
+        yield '+ ' + line
+
+
+def compare(a, b, max_work=MAX_WORK):
+    # Drop-in replacement for difflib.Differ().compare(a, b) (lists of lines
+    # keeping their line ends). Lines are compared by hash, through a linear
+    # scan of common prefix and suffix plus Myers for what is left. If that
+    # takes too much work, the differing block is shown truncated and a line
+    # starting with '!' says so.
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < len(a) - prefix and suffix < len(b) - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+
+    for line in a[:prefix]:
+        yield '  ' + line
+
+    a_middle, b_middle = a[prefix:len(a) - suffix], b[prefix:len(b) - suffix]
+    ids = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a_middle]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b_middle]
+    ops = myers(a_ids, b_ids, max_work)
+    if ops is None:
+        for line in a_middle[:TRUNCATED_LINES]:
+            yield '- ' + line
+        for line in b_middle[:TRUNCATED_LINES]:
+            yield '+ ' + line
+        yield f'! diff truncated: {len(a_middle)} and {len(b_middle)} lines differ too much\n'
+
+    else:
+        removed, added = [], []
+        for tag, i, j in ops:
+            if tag == '-':
+                removed.append(a_middle[i])
+            elif tag == '+':
+                added.append(b_middle[j])
+            else:
+                yield from _hunk(removed, added)
+                removed, added = [], []
+                yield '  ' + a_middle[i]
+        yield from _hunk(removed, added)
+
+    for line in a[len(a) - suffix:]:
+        yield '  ' + line
@@ -0,0 +1,322 @@
+# distributed
+#
+# Grading across many machines. A coordinator (`tst --coordinator PORT`)
+# collects tests and subjects as usual, then waits for `tst worker HOST:PORT`
+# processes to connect over tcp. Each worker gets a copy of the test files and
+# pulls shards of subjects, grades them with its own pool of test workers
+# and streams the results of each test run back. The coordinator merges them
+# exactly as local results as each shard is done, so reports are the same.
+# Messages are json lines:
+#
+#   worker -> coordinator: {"token": "..."} (null unless the worker has one)
+#   coordinator -> worker: {"files": {...}, "test_sources": [...], "options": {...}}
+#   coordinator -> worker: {"subjects": {name: base64 contents}} or {"exit": true}
+#   worker -> coordinator: {"result": {...}} (per test run), then {"done": true}
+#   worker -> coordinator: {"error": "..."} (the worker gives up)
+#   coordinator -> worker: {"error": "..."} (wrong token)
+#
+# Workers run whatever tests the coordinator sends and the coordinator takes
+# their results as they come: with a token (--token or TST_TOKEN) only
+# workers that know it get files and shards. Results that don't match a
+# test case and subject of the shard make the shard go to other workers.
+# Test sources, spec files and the files required by the spec are sent to the
+# workers. Subjects run with the worker's own config (interpreters, cache, etc.).
+# Subjects outside the coordinator's directory are sent under relative names
+# and their results are mapped back.
+
+import os
+import sys
+import hmac
+import socket
+import logging
+import tempfile
+import threading
+import collections
+import socketserver
+
+from tst.forkserver import encode, decode, send, receive
+from tst.utils import log_handler
+
+log = logging.getLogger('tst-distributed')
+log.setLevel(logging.DEBUG)
+log.addHandler(log_handler())
+
+# subjects handed to a worker at a time
+SHARD_SIZE = 8
+
+# coordinator options that change results (the rest are the worker's)
+SHARED_OPTIONS = ['timeout', 'fail_fast', 'retry_timeouts', 'batch']
+
+# specification files sent along with the test sources
+SPEC_FILES = ['tst.yaml', 'tst.json']
+
+# directory (in the worker's) for subjects outside the coordinator's directory
+OUTSIDE = '_outside'
+
+# seconds a worker may stay silent in the middle of a shard (besides the test
+# timeout) before its shard goes to other workers
+WORKER_TIMEOUT = 120
+
+# numeric fields of results (used by the reports)
+NUMERIC_FIELDS = ['time', 'wait', 'user_time', 'sys_time', 'maxrss']
+
+
+def parse_address(address, host='127.0.0.1'):
+    # PORT or HOST:PORT
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+    else:
+        port = address
+
+    return host, int(port)
+
+
+def read_files(filenames):
+    files = {}
+    for fn in filenames:
+        if os.path.isfile(fn):
+            with open(fn, 'rb') as f:
+                files[fn] = encode(f.read())
+
+    return files
+
+
+def write_files(directory, files):
+    # files come from the network: keep them inside directory
+    for fn, data in files.items():
+        path = os.path.normpath(os.path.join(directory, fn))
+        if not path.startswith(directory + os.sep):
+            raise ValueError(f"invalid filename: {fn}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(decode(data))
+
+
+def remote_names(subjects):
+    # the name of each subject on workers: a relative path inside the
+    # worker's directory (absolute and ../ paths get one under OUTSIDE)
+    names = {}
+    for i, fn in enumerate(sorted(subjects)):
+        name = os.path.normpath(fn)
+        if os.path.isabs(name) or name.split(os.sep)[0] == os.pardir or name in names:
+            name = os.path.join(OUTSIDE, str(i), os.path.basename(fn))
+        names[name] = fn
+
+    return names
+
+
+def serialize(test_result):
+    # a test run result without the objects that only make sense locally
+    data = {k: v for k, v in test_result.items() if not k.startswith('_')}
+    data['test_suite'] = test_result['_test_suite']
+    data['index'] = test_result['_testcase'].index
+    return data
+
+
+class Coordinator(socketserver.ThreadingMixIn, socketserver.TCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, setup, subjects, test_cases=(), on_result=None, verbose=0, timeout=WORKER_TIMEOUT, token=None):
+        # subjects maps names on workers to local filenames
+        self.setup = setup
+        self.subjects = subjects
+        self.test_cases = {(tc.test_suite, tc.index): tc for tc in test_cases}
+        self.on_result = on_result
+        self.verbose = verbose
+        self.timeout = timeout
+        self.token = token
+        self.cond = threading.Condition()
+        self.merging = threading.Lock()
+        names = list(subjects)
+        self.shards = collections.deque(names[i:i + SHARD_SIZE] for i in range(0, len(names), SHARD_SIZE))
+        self.in_flight = 0
+        self.graded = 0
+        self.total = len(subjects)
+        self.results = []
+        super().__init__(address, WorkerHandler)
+
+    def next_shard(self):
+        # blocks while other workers may still give their shards back
+        with self.cond:
+            while not self.shards and self.in_flight:
+                self.cond.wait()
+
+            if not self.shards:
+                return None
+
+            self.in_flight += 1
+            return self.shards.popleft()
+
+    def authorized(self, token):
+        if not self.token:
+            return True
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def restore(self, result, shard):
+        # a worker's result as if it was run locally (ValueError if it's not
+        # a result of this shard)
+        try:
+            testcase = self.test_cases[(result.pop('test_suite'), result.pop('index'))]
+            name = result['subject']
+            valid = name in shard and isinstance(result['summary'], str)
+            valid = valid and all(isinstance(result.get(k) or 0, (int, float)) for k in NUMERIC_FIELDS)
+        except (KeyError, TypeError, AttributeError):
+            valid = False
+        if not valid:
+            raise ValueError("invalid result")
+
+        result['_test_suite'] = testcase.test_suite
+        result['_testcase'] = testcase
+        result['subject'] = self.subjects[name]
+        return result
+
+    def finish(self, shard, results):
+        # results reach the reports before wait() can return
+        with self.merging:
+            for test_result in results:
+                self.on_result and self.on_result(test_result)
+
+        with self.cond:
+            self.in_flight -= 1
+            self.graded += len(shard)
+            self.results.extend(results)
+            self.cond.notify_all()
+        self.verbose and print(f"* {self.graded}/{self.total} subjects graded", file=sys.stderr, flush=True)
+
+    def read_shard(self, shard):
+        # subjects under their names on workers
+        files = read_files(self.subjects[name] for name in shard)
+        return {name: files[self.subjects[name]] for name in shard if self.subjects[name] in files}
+
+    def give_back(self, shard):
+        # the worker left before finishing the shard: someone else will do it
+        with self.cond:
+            self.in_flight -= 1
+            self.shards.appendleft(shard)
+            self.cond.notify_all()
+
+    def wait(self):
+        with self.cond:
+            while self.shards or self.in_flight:
+                self.cond.wait()
+
+        return self.results
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        # a worker that stops responding loses its shard (socket.timeout)
+        self.timeout = self.server.timeout
+        super().setup()
+
+    def handle(self):
+        server = self.server
+        try:
+            message = receive(self.rfile)
+            if not server.authorized(message.get('token')):
+                log.warning(f'worker {self.client_address} rejected: invalid token')
+                server.verbose and print(f"* worker {self.client_address[0]}:{self.client_address[1]} rejected: invalid token", file=sys.stderr, flush=True)
+                send(self.wfile, {'error': 'invalid token'})
+                return
+            server.verbose and print(f"* worker connected from {self.client_address[0]}:{self.client_address[1]}", file=sys.stderr, flush=True)
+            send(self.wfile, server.setup)
+        except (OSError, ValueError, AttributeError):
+            return
+
+        while True:
+            shard = server.next_shard()
+            if shard is None:
+                try:
+                    send(self.wfile, {'exit': True})
+                except OSError:
+                    pass
+                return
+
+            try:
+                # results are only merged once the whole shard is done, so a
+                # shard given back is never counted twice
+                results = []
+                send(self.wfile, {'subjects': server.read_shard(shard)})
+                while True:
+                    message = receive(self.rfile)
+                    if message.get('done'):
+                        break
+                    if 'error' in message:
+                        raise ValueError(message['error'])
+                    results.append(server.restore(message['result'], shard))
+
+            except (OSError, ValueError, KeyError, AttributeError) as e:
+                log.warning(f'worker {self.client_address} lost: ERROR={e.__class__.__name__} MSG=`{e}`')
+                server.verbose and print(f"* worker {self.client_address[0]}:{self.client_address[1]} lost", file=sys.stderr, flush=True)
+                server.give_back(shard)
+                return
+
+            server.finish(shard, results)
+
+
+def run_distributed(test_cases, test_suites, subjects, options, on_result=None, aggregator=None):
+    # same contract as run_tests_in_parallel, with tests run by remote workers
+    from tst.commands.test import required_files
+
+    setup = {
+        'files': read_files(list(options.test_sources) + SPEC_FILES + required_files()),
+        'test_sources': list(options.test_sources),
+        'options': {name: getattr(options, name) for name in SHARED_OPTIONS}
+    }
+
+    all_tests_results = []
+    def merge(test_result):
+        all_tests_results.append(test_result)
+        aggregator and aggregator.add(test_result)
+        on_result and on_result(test_result)
+
+    address = parse_address(options.coordinator)
+    coordinator = Coordinator(address, setup, remote_names(subjects), test_cases=test_cases, on_result=merge,
+        verbose=options.verbose, timeout=options.timeout + WORKER_TIMEOUT, token=options.token)
+    options.quiet or print(f"* waiting for workers at {address[0]}:{coordinator.server_address[1]} (tst worker HOST:PORT)", file=sys.stderr, flush=True)
+    threading.Thread(target=coordinator.serve_forever, daemon=True).start()
+    try:
+        coordinator.wait()
+    finally:
+        coordinator.shutdown()
+        coordinator.server_close()
+
+    return all_tests_results
+
+
+def work(address, jobs=None, fork_server=False, cache=True, token=None):
+    # a worker: grade shards of subjects until the coordinator says so
+    from tst.runner import Runner
+
+    with socket.create_connection(parse_address(address)) as conn, \
+            tempfile.TemporaryDirectory(prefix='tst-worker-') as directory:
+        rfile, wfile = conn.makefile('rb'), conn.makefile('wb')
+        send(wfile, {'token': token})
+        setup = receive(rfile)
+        if 'error' in setup:
+            raise ValueError(f"coordinator: {setup['error']}")
+        directory = os.path.realpath(directory)
+        try:
+            write_files(directory, setup['files'])
+            os.chdir(directory)
+
+            # suites live in a temporary directory: keep them out of the suite cache
+            options = dict(setup['options'], fork_server=fork_server, cache=cache)
+            jobs and options.update(jobs=jobs)
+            with Runner(setup['test_sources'], suite_cache=False, **options) as runner:
+                while True:
+                    message = receive(rfile)
+                    if message.get('exit'):
+                        return
+
+                    write_files(directory, message['subjects'])
+                    runner.run_detailed(list(message['subjects']), on_result=lambda tr: send(wfile, {'result': serialize(tr)}))
+                    send(wfile, {'done': True})
+
+        except ValueError as e:
+            # tell the coordinator why (its shard goes to other workers)
+            send(wfile, {'error': f'{e}'})
+            raise
@@ -0,0 +1,231 @@
+# forkserver
+#
+# Runs python subjects from a pre-warmed interpreter. The server is started
+# once per batch (with the interpreter configured for .py subjects) and forks
+# a child per test, so tests don't pay for interpreter startup. This module is
+# executed as a script by the server, so it must depend on the stdlib only.
+
+import io
+import os
+import sys
+import json
+import time
+import base64
+import runpy
+import shutil
+import signal
+import socket
+import select
+import tempfile
+import traceback
+
+from subprocess import Popen, PIPE, DEVNULL
+
+# modules imported by the server before forking (so children get them for free)
+WARM_MODULES = ['math', 'random', 'string', 're', 'collections', 'itertools', 'functools', 'datetime']
+
+
+def encode(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def decode(data):
+    return base64.b64decode(data.encode('ascii'))
+
+
+def send(wfile, message):
+    wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+    wfile.flush()
+
+
+def receive(rfile):
+    line = rfile.readline()
+    if not line:
+        raise ConnectionError('fork server closed the connection')
+    return json.loads(line)
+
+
+def exit_code(e):
+    # mimic the interpreter handling of SystemExit
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+def set_limits(limits, output_limit):
+    # same as tst.process.set_limits (this script can't import tst)
+    import resource
+    rlimits = {
+        'memory': (resource.RLIMIT_AS, 1024 * 1024),
+        'cpu': (resource.RLIMIT_CPU, 1),
+        'processes': (resource.RLIMIT_NPROC, 1),
+        'file-size': (resource.RLIMIT_FSIZE, 1024 * 1024),
+    }
+    for name, value in limits.items():
+        rlimit, unit = rlimits[name]
+        soft = value * unit
+        hard = soft + 1 if rlimit == resource.RLIMIT_CPU else soft
+        if rlimit == resource.RLIMIT_FSIZE and output_limit is not None:
+            soft = hard = min(soft, output_limit + 1)
+        resource.setrlimit(rlimit, (soft, hard))
+
+    if output_limit is not None and 'file-size' not in limits:
+        # output goes to files: writes past the limit fail instead of piling up
+        signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+        resource.setrlimit(resource.RLIMIT_FSIZE, (output_limit + 1, output_limit + 1))
+
+
+def run_subject(subject, stdin, stdout, stderr, limit, limits):
+    # grandchild: run subject as __main__ with fds 0, 1 and 2 redirected
+    os.dup2(stdin.fileno(), 0)
+    os.dup2(stdout.fileno(), 1)
+    os.dup2(stderr.fileno(), 2)
+    set_limits(limits, limit)
+    sys.stdin = io.TextIOWrapper(io.FileIO(0, 'r', closefd=False), encoding='utf-8')
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), encoding='utf-8', errors='backslashreplace')
+    sys.argv = [subject]
+    sys.path[0] = os.path.dirname(os.path.abspath(subject))
+
+    code = 0
+    try:
+        runpy.run_path(subject, run_name='__main__')
+    except SystemExit as e:
+        code = exit_code(e)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+
+    try:
+        import atexit
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        pass
+
+    os._exit(code)
+
+
+def handle(conn):
+    # child: report pid (the client kills our group on timeout) then run test
+    os.setsid()
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    rfile, wfile = conn.makefile('rb'), conn.makefile('wb')
+    send(wfile, {'pid': os.getpid()})
+    request = receive(rfile)
+    request.get('cwd') and os.chdir(request['cwd'])
+
+    with tempfile.TemporaryFile() as stdin, \
+            tempfile.TemporaryFile() as stdout, \
+            tempfile.TemporaryFile() as stderr:
+        stdin.write(decode(request['input']))
+        stdin.seek(0)
+        pid = os.fork()
+        if pid == 0:
+            run_subject(request['subject'], stdin, stdout, stderr, request.get('limit'), request.get('limits') or {})
+
+        _, status, rusage = os.wait4(pid, 0)
+        returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        stdout.seek(0)
+        stderr.seek(0)
+        send(wfile, {
+            'returncode': returncode,
+            'stdout': encode(stdout.read()),
+            'stderr': encode(stderr.read()),
+            'user_time': rusage.ru_utime,
+            'sys_time': rusage.ru_stime,
+            'maxrss': rusage.ru_maxrss // 1024 if sys.platform == 'darwin' else rusage.ru_maxrss
+        })
+
+    os._exit(0)
+
+
+def serve(path):
+    # this script's own directory must not shadow subject modules
+    sys.path.pop(0)
+    for name in WARM_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+    parent = os.getppid()
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN) # children are reaped by the kernel
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(128)
+    print('ready', flush=True)
+
+    # leave as soon as the tst process that started us is gone
+    while os.getppid() == parent:
+        if not select.select([server], [], [], 1)[0]:
+            continue
+
+        conn, _ = server.accept()
+        if os.fork() == 0:
+            server.close()
+            try:
+                handle(conn)
+            finally:
+                os._exit(1)
+
+        conn.close()
+
+
+class ForkServer:
+
+    def __init__(self, command):
+        self.directory = tempfile.mkdtemp(prefix='tst-forkserver-')
+        self.path = os.path.join(self.directory, 'socket')
+        self.process = Popen(command + [os.path.abspath(__file__), self.path], stdin=DEVNULL, stdout=PIPE)
+        self.process.stdout.readline() # wait until server is ready
+
+    def run(self, subject, input_data, timeout, stdout_limit=None, stderr_limit=None, limits=None, cwd=None):
+        child = {'returncode': None, 'stdout': b'', 'stderr': b'', 'timeout': False, 'output_limit': False}
+        child.update(user_time=None, sys_time=None, maxrss=None)
+        output_limits = [l for l in (stdout_limit, stderr_limit) if l is not None]
+        t0 = time.monotonic()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(self.path)
+            conn.settimeout(timeout)
+            rfile, wfile = conn.makefile('rb'), conn.makefile('wb')
+            pid = receive(rfile)['pid']
+            try:
+                send(wfile, {'subject': subject, 'input': encode(input_data or b''), 'limit': max(output_limits, default=None), 'limits': limits, 'cwd': cwd})
+                response = receive(rfile)
+
+            except socket.timeout:
+                child['timeout'] = True
+                response = None
+
+            finally:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+
+        child['time'] = time.monotonic() - t0
+        if response:
+            child['returncode'] = response['returncode']
+            child['stdout'] = decode(response['stdout'])
+            child['stderr'] = decode(response['stderr'])
+            child.update({k: response.get(k) for k in ('user_time', 'sys_time', 'maxrss')})
+            child['output_limit'] = (
+                stdout_limit is not None and len(child['stdout']) > stdout_limit or
+                stderr_limit is not None and len(child['stderr']) > stderr_limit
+            )
+
+        return child
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1])
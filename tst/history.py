@@ -0,0 +1,64 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import tst
+
+HISTORY_SIZE = 10000 # test cases kept (the most recently run)
+HISTORY_MAX_AGE = 90 * 24 * 3600 # seconds since a test case was last run
+
+
+class FailureHistory:
+
+    # Runs and failures of each test case (by suite and spec), used to run
+    # likely failures first. Entries are [runs, fails, last run timestamp].
+
+    def __init__(self, filename=None):
+        self.filename = filename or os.path.join(tst.tst.CONFIGDIR, 'history.json')
+        self.lock = threading.Lock()
+        self.changed = False
+        try:
+            with open(self.filename, encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def key(self, testcase):
+        spec = json.dumps(testcase.spec, sort_keys=True, default=str)
+        return f"{testcase.test_suite}:{hashlib.md5(spec.encode('utf-8')).hexdigest()}"
+
+    def rate(self, testcase):
+        runs, fails = self.data.get(self.key(testcase), (0, 0))[:2]
+        return fails / runs if runs else 0
+
+    def record(self, testcase, failed):
+        key = self.key(testcase)
+        with self.lock:
+            runs, fails = self.data.pop(key, (0, 0))[:2]
+            self.data[key] = [runs + 1, fails + int(failed), int(time.time())]
+            self.changed = True
+
+    def prune(self):
+        # drop test cases not run for long (entries without a timestamp
+        # come from older versions) and keep the most recent ones
+        oldest = time.time() - HISTORY_MAX_AGE
+        entries = [(k, v) for k, v in self.data.items() if len(v) > 2 and v[2] >= oldest]
+        entries.sort(key=lambda entry: entry[1][2])
+        self.data = dict(entries[-HISTORY_SIZE:])
+
+    def save(self):
+        if not self.changed:
+            return
+
+        with self.lock:
+            self.prune()
+
+        tmp = f'{self.filename}.{os.getpid()}.{threading.get_ident()}'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.filename)
+        except OSError:
+            pass
@@ -27,7 +27,6 @@ import io
 import sys
 import os
 import json
-import yaml
 
 def to_unicode(obj, encoding='utf-8'):
     # 2to3: assert isinstance(obj, basestring), type(obj)
@@ -46,6 +45,13 @@ def to_unicode(obj, encoding='utf-8'):
 
 class CorruptedJsonFile(Exception): pass
 
+def file_stamp(filename):
+    try:
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
 DEFAULT_FAIL_MESSAGE = "file is corrupted"
 
 class JsonFile(object):
@@ -55,15 +61,24 @@ class JsonFile(object):
     def __new__(cls, filename, exit_on_fail=False, failmsg=None, array2map=None, writable=False):
         filename = os.path.expanduser(filename)
         if filename in JsonFile.__instances:
-            return JsonFile.__instances[filename]
+            self = JsonFile.__instances[filename]
+            if self.stamp != file_stamp(filename):
+                # file changed since it was read (e.g. tst --watch): read it again
+                self.read(failmsg, exit_on_fail, array2map)
+            return self
 
         JsonFile.__instances[filename] = object.__new__(cls)
         self = JsonFile.__instances[filename]
         self.filename = filename
         self.writable = writable
         self.isjson = filename.endswith("json")
-        
-        if os.path.exists(filename):
+        self.read(failmsg, exit_on_fail, array2map)
+        return self
+
+
+    def read(self, failmsg=None, exit_on_fail=False, array2map=None):
+        self.stamp = file_stamp(self.filename)
+        if os.path.exists(self.filename):
             self.load(failmsg=failmsg, exit_on_fail=exit_on_fail)
             if array2map and type(self.data) is list:
                 self.data = { array2map: self.data }
@@ -71,8 +86,6 @@ class JsonFile(object):
         else:
             self.data = {}
 
-        return self
-
 
     def __setitem__(self, key, value):
         self.data[key] = value
@@ -113,9 +126,14 @@ class JsonFile(object):
                 raise CorruptedJsonFile("corrupted specification file")
 
         else:
+            # yaml is imported only when actually needed (it is slow to import)
+            import yaml
+
+            # libyaml based loader is much faster (pure python fallback otherwise)
+            loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
             try:
                 with open(self.filename, mode='r', encoding='utf-8') as f:
-                    self.data = yaml.load(f.read(), Loader=yaml.FullLoader)
+                    self.data = yaml.load(f.read(), Loader=loader)
                     if self.data is None:
                         raise ValueError()
 
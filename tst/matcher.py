@@ -0,0 +1,54 @@
+import re
+
+
+def is_literal(pattern):
+    return re.escape(pattern) == pattern
+
+
+def _is_word(c):
+    # same definition of word characters as re's unicode \b
+    return c.isalnum() or c == '_'
+
+
+def _at_boundary(text, i):
+    before = i > 0 and _is_word(text[i - 1])
+    after = i < len(text) and _is_word(text[i])
+    return before != after
+
+
+def _fold(text):
+    # lowercase without changing indexes
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class OrderedMatcher:
+
+    # Matches texts containing a sequence of literals in order, as the regex
+    # `.*lit1.*lit2.*` (with \b around bounded literals) would, but with a
+    # single forward scan: taking the leftmost occurrence of each literal is
+    # always safe, so there is no backtracking and the scan is linear.
+
+    def __init__(self, literals, ignore_case=False):
+        # literals: list of (text, bounded) pairs
+        self.ignore_case = ignore_case
+        self.literals = [(_fold(lit) if ignore_case else lit, bounded) for lit, bounded in literals]
+
+    def match(self, text):
+        if self.ignore_case:
+            text = _fold(text)
+
+        pos = 0
+        for literal, bounded in self.literals:
+            i = text.find(literal, pos)
+            while bounded and i != -1 and not (_at_boundary(text, i) and _at_boundary(text, i + len(literal))):
+                i = text.find(literal, i + 1)
+
+            if i == -1:
+                return False
+
+            pos = i + len(literal)
+
+        return True
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import select
+import signal
+import resource
+import selectors
+
+from subprocess import Popen, PIPE
+
+READ_SIZE = 32768
+
+# resource limits for subjects: name -> (rlimit, unit)
+MB = 1024 * 1024
+LIMITS = {
+    'memory': (resource.RLIMIT_AS, MB), # address space, in megabytes
+    'cpu': (resource.RLIMIT_CPU, 1), # cpu time, in seconds
+    'processes': (resource.RLIMIT_NPROC, 1), # processes of the user (not just the subject's!)
+    'file-size': (resource.RLIMIT_FSIZE, MB), # size of files written, in megabytes
+}
+
+
+def set_limits(limits):
+    # runs in the child (preexec_fn) right before exec
+    for name, value in limits.items():
+        rlimit, unit = LIMITS[name]
+        soft = value * unit
+        # the soft cpu limit sends SIGXCPU: the hard one (a second later) kills
+        hard = soft + 1 if rlimit == resource.RLIMIT_CPU else soft
+        resource.setrlimit(rlimit, (soft, hard))
+
+
+def kill_group(process):
+    # children run as leaders of their own process group (see run_process)
+    # so killing the group also takes down grandchildren (e.g. runjava's java)
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def usage(rusage):
+    # resources used by a finished child (ru_maxrss is in bytes on macos)
+    maxrss = rusage.ru_maxrss // 1024 if sys.platform == 'darwin' else rusage.ru_maxrss
+    return {'user_time': rusage.ru_utime, 'sys_time': rusage.ru_stime, 'maxrss': maxrss}
+
+
+def _wait(process, deadline=None):
+    # like process.wait, but the child is reaped with wait4 to get its rusage
+    # (returns None if it is still running at the deadline)
+    delay = 0.001
+    while True:
+        try:
+            pid, status, rusage = os.wait4(process.pid, 0 if deadline is None else os.WNOHANG)
+        except ChildProcessError:
+            process.wait()
+            return {}
+
+        if pid:
+            break
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(2 * delay, 0.05)
+
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return usage(rusage)
+
+
+def _communicate(process, input_data, timeout, limits, child):
+    # like Popen.communicate, but output is captured only up to the limit of
+    # each stream: the process is killed as soon as any limit is exceeded
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    captured = {process.stdout: [], process.stderr: []}
+    sizes = {process.stdout: 0, process.stderr: 0}
+    input_view = memoryview(input_data or b'')
+    offset = 0
+
+    with selectors.DefaultSelector() as selector:
+        if process.stdin and input_view:
+            selector.register(process.stdin, selectors.EVENT_WRITE)
+        elif process.stdin:
+            process.stdin.close()
+        selector.register(process.stdout, selectors.EVENT_READ)
+        selector.register(process.stderr, selectors.EVENT_READ)
+
+        while selector.get_map():
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                child['timeout'] = True
+                break
+
+            for key, _ in selector.select(remaining):
+                if key.fileobj is process.stdin:
+                    try:
+                        offset += os.write(key.fd, input_view[offset:offset + select.PIPE_BUF])
+                    except BrokenPipeError:
+                        offset = len(input_view)
+                    if offset >= len(input_view):
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+                    continue
+
+                data = os.read(key.fd, READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+
+                captured[key.fileobj].append(data)
+                sizes[key.fileobj] += len(data)
+                limit = limits[key.fileobj]
+                if limit is not None and sizes[key.fileobj] > limit:
+                    child['output_limit'] = True
+
+            if child['output_limit']:
+                break
+
+    for stream in (process.stdin, process.stdout, process.stderr):
+        stream and stream.close()
+
+    # a child may close its pipes and keep running: the deadline still holds
+    resources = None
+    if not child['timeout'] and not child['output_limit']:
+        resources = _wait(process, deadline)
+        child['timeout'] = resources is None
+
+    if resources is None:
+        kill_group(process)
+        resources = _wait(process)
+
+    child.update(resources)
+    return b''.join(captured[process.stdout]), b''.join(captured[process.stderr])
+
+
+def run_process(command, input_data=None, timeout=None, stdout_limit=None, stderr_limit=None, limits=None, cwd=None):
+    # Runs command in a new session with its own deadline. Unlike SIGALRM,
+    # this works in any thread and each child keeps its own timeout.
+    child = {'returncode': None, 'stdout': b'', 'stderr': b'', 'timeout': False, 'output_limit': False}
+    child.update(user_time=None, sys_time=None, maxrss=None)
+    stdin = PIPE if input_data is not None else None
+    t0 = time.monotonic()
+    preexec_fn = limits and (lambda: set_limits(limits)) or None
+    process = Popen(command, stdin=stdin, stdout=PIPE, stderr=PIPE, start_new_session=True, preexec_fn=preexec_fn, cwd=cwd)
+    try:
+        limits = {process.stdout: stdout_limit, process.stderr: stderr_limit}
+        stdout, stderr = _communicate(process, input_data, timeout, limits, child)
+
+    except BaseException:
+        kill_group(process)
+        process.wait()
+        raise
+
+    # leftovers of a finished subject (background grandchildren) are not welcome
+    kill_group(process)
+
+    child['time'] = time.monotonic() - t0
+    child['returncode'] = process.returncode
+    child['stdout'] = stdout
+    child['stderr'] = stderr
+    return child
@@ -0,0 +1,82 @@
+import os
+import contextlib
+
+from tst.utils import TstError
+from tst.commands.test import (
+    default_options,
+    collect_test_cases,
+    select_subjects,
+    run_tests_in_parallel,
+    start_forkserver,
+    ResultsAggregator,
+)
+from tst.cache import fingerprints
+
+
+@contextlib.contextmanager
+def raising():
+    # the cli exits on errors (see _assert): the api raises TstError instead
+    try:
+        yield
+    except SystemExit as e:
+        raise TstError(getattr(e, 'msg', e.code if isinstance(e.code, str) else 'tst error')) from None
+
+
+class Runner:
+
+    # In-process api to run test suites: suites are parsed once (and a fork
+    # server is kept warm, if enabled) and reused by every call to run. The
+    # options are the same as the cli ones (e.g. timeout, jobs, fork_server).
+    # Errors (e.g. invalid suites) raise TstError.
+    #
+    #     runner = Runner(['tests.yaml'], timeout=5)
+    #     runner.run(['sub1.py', 'sub2.py'])
+    #     {'sub1.py': {'tests.yaml': '..F'}, 'sub2.py': {'tests.yaml': '...'}}
+
+    def __init__(self, test_sources, ignore=(), suite_cache=True, **options):
+        self.options = default_options(test_sources=list(test_sources), **options)
+        self.ignore = list(ignore)
+        with raising():
+            self.test_cases = collect_test_cases(self.options.test_sources, use_cache=self.options.cache and suite_cache)
+        if not self.test_cases:
+            # e.g. missing suites: an error rather than empty reports
+            raise TstError(f"no test cases found in: {' '.join(self.options.test_sources)}")
+        self.test_suites = list(dict.fromkeys(tc.test_suite for tc in self.test_cases))
+        self.forkserver = self.options.fork_server and start_forkserver() or None
+        self.stamps = self._stamps()
+
+    def _stamps(self):
+        return [os.stat(ts).st_mtime_ns if os.path.exists(ts) else None for ts in self.options.test_sources]
+
+    def is_stale(self):
+        # test sources changed since they were parsed
+        return self._stamps() != self.stamps
+
+    def run_detailed(self, subjects, on_result=None):
+        # returns the results map with each subject's failed test runs (and
+        # calls on_result with the result of each test run as it finishes)
+        subjects = select_subjects(subjects, self.test_cases, self.test_suites, self.ignore)
+        fingerprints().update(subjects)
+        aggregator = ResultsAggregator(self.test_suites, self.test_cases)
+        with raising():
+            run_tests_in_parallel(self.test_cases, self.test_suites, subjects, self.options, on_result=on_result, aggregator=aggregator, forkserver=self.forkserver)
+        return aggregator.results()
+
+    def run(self, subjects):
+        # returns the same results map the json report shows
+        results = self.run_detailed(subjects)
+        for res in results.values():
+            res.pop('_failed', None)
+            res.pop('_profile', None)
+
+        return results
+
+    def close(self):
+        self.forkserver and self.forkserver.close()
+        self.forkserver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
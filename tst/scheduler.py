@@ -0,0 +1,183 @@
+import os
+import time
+import logging
+import threading
+import collections
+
+from tst.utils import log_handler
+
+log = logging.getLogger('tst-scheduler')
+log.setLevel(logging.DEBUG)
+log.addHandler(log_handler())
+
+
+class Scheduler:
+
+    def __init__(self, worker, jobs=None):
+        self.worker = worker
+        self.jobs = jobs or os.cpu_count() or 1
+        self.limit = self.jobs # jobs running at once (at most self.jobs)
+        self.pending = collections.deque()
+        self.cond = threading.Condition()
+        self.threads = []
+        self.closed = False
+        self.submitted = 0
+        self.running = 0
+        self.done = 0
+
+    def submit(self, job):
+        with self.cond:
+            self.pending.append(job)
+            self.submitted += 1
+            self.cond.notify()
+
+    def start(self):
+        for _ in range(self.jobs):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def set_limit(self, limit):
+        with self.cond:
+            self.limit = max(1, min(limit, self.jobs))
+            self.cond.notify_all()
+
+    def close(self):
+        # no more jobs will be submitted: idle workers may leave
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def join(self):
+        self.close()
+        for thread in self.threads:
+            thread.join()
+
+    def cancel(self, predicate):
+        # drop pending jobs matching predicate; they are returned to the caller
+        with self.cond:
+            cancelled = [job for job in self.pending if predicate(job)]
+            if cancelled:
+                self.pending = collections.deque(job for job in self.pending if not predicate(job))
+                self.done += len(cancelled)
+
+        return cancelled
+
+    def counts(self):
+        with self.cond:
+            return len(self.pending), self.running, self.done
+
+    def _next_job(self):
+        with self.cond:
+            while not self.pending or self.running >= self.limit:
+                if not self.pending and self.closed:
+                    self.cond.notify() # pass it on: other idle workers must leave too
+                    return None
+                self.cond.wait()
+
+            self.running += 1
+            return self.pending.popleft()
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            try:
+                self.worker(job)
+            except Exception as e:
+                # a failing job must not take its worker down with it
+                log.exception(f"job failed: {e}")
+            finally:
+                with self.cond:
+                    self.running -= 1
+                    self.done += 1
+                    self.cond.notify()
+
+
+def available_memory():
+    # fraction of memory available (linux only: None elsewhere)
+    try:
+        with open('/proc/meminfo') as f:
+            meminfo = dict(line.split(':', 1) for line in f)
+        return int(meminfo['MemAvailable'].split()[0]) / int(meminfo['MemTotal'].split()[0])
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+class AdaptiveLimit:
+
+    # Adjusts the concurrency limit of a scheduler while it runs: one more
+    # job at a time while the machine has room, half of them on signs of
+    # overload (high load average, little available memory, tests running
+    # much slower than they did or timing out more often than they did).
+
+    MAX_LOAD = 1.0 # load average per cpu
+    MIN_MEMORY = 0.1 # fraction of memory available
+    MAX_SLOWDOWN = 2.0 # recent latency over the best latency seen
+    COOLDOWN = 3 # seconds between decreases (let the load average settle)
+
+    def __init__(self, scheduler, start=None):
+        self.scheduler = scheduler
+        self.cpus = os.cpu_count() or 1
+        self.lock = threading.Lock()
+        self.best = {}
+        self.window = []
+        self.runs = 0
+        self.timeouts = 0
+        self.decreased = 0
+        scheduler.set_limit(start or min(scheduler.jobs, self.cpus))
+
+    def observe(self, key, seconds, timeout=False):
+        # key identifies the kind of test (e.g. the test case), so latencies
+        # of short and long tests are compared to their own best
+        with self.lock:
+            if not timeout:
+                self.best[key] = min(seconds, self.best.get(key, seconds))
+            self.window.append((key, seconds, timeout))
+
+    def overload(self):
+        # returns why the machine seems overloaded (or None)
+        with self.lock:
+            window, self.window = self.window, []
+            runs, timeouts = self.runs, self.timeouts
+            self.runs += len(window)
+            self.timeouts += sum(1 for _, _, timeout in window if timeout)
+
+        try:
+            load = os.getloadavg()[0] / self.cpus
+        except OSError:
+            load = 0
+        if load > self.MAX_LOAD:
+            return f"load average {load:.2f} per cpu"
+
+        memory = available_memory()
+        if memory is not None and memory < self.MIN_MEMORY:
+            return f"{100 * memory:.0f}% memory available"
+
+        recent_timeouts = sum(1 for _, _, timeout in window if timeout)
+        if runs and recent_timeouts and recent_timeouts / len(window) > 2 * (timeouts / runs if runs else 0):
+            return f"{recent_timeouts} recent timeouts"
+
+        slowdowns = [seconds / self.best[key] for key, seconds, timeout in window if not timeout and self.best.get(key)]
+        if slowdowns and sum(slowdowns) / len(slowdowns) > self.MAX_SLOWDOWN:
+            return f"tests {sum(slowdowns) / len(slowdowns):.1f}x slower"
+
+        return None
+
+    def adjust(self):
+        # returns the new limit and the reason for changing it (or None)
+        limit = self.scheduler.limit
+        reason = self.overload()
+        if reason and limit > 1 and time.monotonic() - self.decreased > self.COOLDOWN:
+            self.decreased = time.monotonic()
+            self.scheduler.set_limit(limit // 2)
+            return self.scheduler.limit, reason
+
+        queued, running, _ = self.scheduler.counts()
+        if not reason and queued and running >= limit and limit < self.scheduler.jobs:
+            self.scheduler.set_limit(limit + 1)
+            return self.scheduler.limit, 'room for more'
+
+        return limit, None
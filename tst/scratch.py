@@ -0,0 +1,105 @@
+import os
+import errno
+import fcntl
+import queue
+import shutil
+import tempfile
+import threading
+import contextlib
+
+import tst
+
+FICLONE = 0x40049409 # ioctl to reflink a file (linux: btrfs, xfs, ...)
+
+# errors meaning "not supported here" (rather than a problem with a file)
+UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.ENOSYS}
+
+
+class ScratchDirs:
+
+    # Private working directories for test runs, so subjects writing files
+    # don't race each other. Files are staged into them by reflink (copy on
+    # write) or hardlink when possible, by copying otherwise. Note writes to
+    # a hardlinked file (not replacing it) reach the original. Directories
+    # are removed by a background thread, off the critical path.
+
+    def __init__(self):
+        self.base = tempfile.mkdtemp(prefix='tst-scratch-', dir=self._parent())
+        self.methods = ['reflink', 'link', 'copy']
+        self.staged = {method: 0 for method in self.methods}
+        self.lock = threading.Lock()
+        self.trash = queue.Queue()
+        self.cleaner = threading.Thread(target=self._clean, daemon=True)
+        self.cleaner.start()
+
+    def _parent(self):
+        # reflinks and hardlinks only work within a filesystem: prefer a
+        # place on the same device as the files to be staged
+        device = os.stat('.').st_dev
+        for parent in [tempfile.gettempdir(), os.path.join(tst.tst.CONFIGDIR, 'scratch')]:
+            try:
+                os.makedirs(parent, exist_ok=True)
+                if os.stat(parent).st_dev == device:
+                    return parent
+            except OSError:
+                pass
+
+        return None
+
+    def _clean(self):
+        while True:
+            directory = self.trash.get()
+            if directory is None:
+                return
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _stage_file(self, src, dst):
+        for method in list(self.methods):
+            try:
+                if method == 'reflink':
+                    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                elif method == 'link':
+                    os.link(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+
+            except OSError as e:
+                if method == 'copy' or e.errno not in UNSUPPORTED:
+                    raise
+                # not supported by this filesystem: don't try it again
+                with self.lock:
+                    method in self.methods and self.methods.remove(method)
+                with contextlib.suppress(OSError):
+                    os.remove(dst)
+                continue
+
+            with self.lock:
+                self.staged[method] += 1
+            return
+
+    def stage(self, directory, filenames):
+        # files keep their relative paths (absolute ones are not staged)
+        for fn in filenames:
+            path = os.path.normpath(fn)
+            if os.path.isabs(path) or path.startswith('..') or not os.path.isfile(fn):
+                continue
+
+            dst = os.path.join(directory, path)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.path.exists(dst) or self._stage_file(fn, dst)
+
+    @contextlib.contextmanager
+    def directory(self, filenames):
+        directory = tempfile.mkdtemp(dir=self.base)
+        try:
+            self.stage(directory, filenames)
+            yield directory
+        finally:
+            self.trash.put(directory)
+
+    def close(self):
+        # waits for pending removals
+        self.trash.put(None)
+        self.cleaner.join()
+        shutil.rmtree(self.base, ignore_errors=True)
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+from tst.build import build, evict
+
+
+class TestBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp.name, 'build')
+        self.runs = os.path.join(self.tmp.name, 'runs')
+
+        # a "compiler" that counts its runs and fails on subjects saying so
+        self.compiler = os.path.join(self.tmp.name, 'cc.sh')
+        with open(self.compiler, 'w') as f:
+            f.write(f'echo >> {self.runs}\ngrep -q error "$1" && echo "syntax error" && exit 1\ncp "$1" "$2"\n')
+        self.command = f'sh {self.compiler} {{}} {{build}}'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def count_runs(self):
+        if not os.path.exists(self.runs):
+            return 0
+        with open(self.runs) as f:
+            return len(f.read())
+
+    def test_built_once_per_contents(self):
+        subject = self.write('a.c', 'int main;\n')
+        target, error = build(subject, self.command, self.directory)
+        self.assertIsNone(error)
+        self.assertTrue(os.path.exists(os.path.join(target, 'a.c')))
+        self.assertEqual(build(subject, self.command, self.directory), (target, None))
+        self.assertEqual(self.count_runs(), 1)
+
+        self.write('a.c', 'int main = 1;\n')
+        self.assertNotEqual(build(subject, self.command, self.directory)[0], target)
+        self.assertEqual(self.count_runs(), 2)
+
+    def test_same_contents_different_names(self):
+        target, _ = build(self.write('a.c', 'int main;\n'), self.command, self.directory)
+        other, _ = build(self.write('b.c', 'int main;\n'), self.command, self.directory)
+        self.assertNotEqual(other, target)
+        self.assertTrue(os.path.exists(os.path.join(other, 'b.c')))
+
+    def test_failed_builds_are_remembered(self):
+        subject = self.write('a.c', 'error\n')
+        self.assertEqual(build(subject, self.command, self.directory), (None, 'syntax error\n'))
+        self.assertEqual(build(subject, self.command, self.directory), (None, 'syntax error\n'))
+        self.assertEqual(self.count_runs(), 1)
+
+    def test_missing_compiler_is_not_remembered(self):
+        subject = self.write('a.c', 'int main;\n')
+        target, error = build(subject, 'no-such-compiler {} {build}', self.directory)
+        self.assertIsNone(target)
+        self.assertIn('build error', error)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_least_recently_used_builds_are_evicted(self):
+        subjects = [self.write(f's{i}.c', 'int x;\n' * 100 + str(i)) for i in range(3)]
+        targets = [build(s, self.command, self.directory)[0] for s in subjects]
+        build(self.write('bad.c', 'error\n'), self.command, self.directory)
+        failed, = [fn for fn in os.listdir(self.directory) if fn.endswith('.failed')]
+        for mtime, path in enumerate([targets[0], targets[1], os.path.join(self.directory, failed), targets[2]]):
+            os.utime(path, (1000 + mtime, 1000 + mtime))
+
+        build(subjects[0], self.command, self.directory) # used: now the most recent
+        evict(self.directory, max_size=2 * 701)
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted(os.path.basename(t) for t in [targets[0], targets[2]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
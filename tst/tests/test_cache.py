@@ -0,0 +1,149 @@
+import os
+import time
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+import tst
+import tst.cache
+from tst.cache import FingerprintIndex, ResultCache
+import tst.commands.test as tst_test
+
+
+class TestFingerprintIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index_file = os.path.join(self.tmp.name, 'fingerprints.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data, age=60):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_unchanged_files_are_not_hashed_again(self):
+        paths = [self.write(f's{i}.py', f'print({i})'.encode()) for i in range(20)]
+        index = FingerprintIndex(self.index_file)
+        index.update(paths)
+        self.assertEqual(index.hashed, 20)
+        self.assertEqual(index.digest(paths[3]), hashlib.md5(b'print(3)').hexdigest())
+
+        index = FingerprintIndex(self.index_file)
+        index.update(paths)
+        self.assertEqual(index.hashed, 0)
+
+    def test_changed_files_are_hashed_again(self):
+        path = self.write('s.py', b'old', age=120)
+        index = FingerprintIndex(self.index_file)
+        index.digest(path)
+        self.write('s.py', b'new', age=60)
+        self.assertEqual(index.digest(path), hashlib.md5(b'new').hexdigest())
+
+    def test_recently_modified_files_are_not_trusted(self):
+        path = self.write('s.py', b'data', age=0)
+        index = FingerprintIndex(self.index_file)
+        index.digest(path)
+        index.digest(path)
+        self.assertEqual(index.hashed, 2)
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.directory = os.path.join(self.tmp.name, 'results')
+
+        # keep the real ~/.tst untouched (TestCase reads the config)
+        home = os.path.join(self.tmp.name, 'home')
+        os.makedirs(home)
+        for patcher in [
+            mock.patch.dict(os.environ, HOME=home),
+            mock.patch.object(tst.tst, 'CONFIGDIR', os.path.join(home, '.tst', '')),
+            mock.patch.object(tst.tst, 'CONFIGFILE', os.path.join(home, '.tst', 'config.yaml')),
+            mock.patch.object(tst.cache, '_fingerprints', None),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write(self, filename, text):
+        with open(filename, 'w') as f:
+            f.write(text)
+
+    def key(self, subject, spec, test_suite='tests.yaml'):
+        # a new cache per run, as run_tests_in_parallel does
+        testrun = tst_test.TestRun(tst_test.TestSubject(subject), tst_test.TestCase(spec, test_suite, 0, 0))
+        return testrun.cache_key(ResultCache(self.directory), 10)
+
+    def test_put_and_get(self):
+        cache = ResultCache(self.directory)
+        self.assertIsNone(cache.get('ab' * 32))
+        cache.put('ab' * 32, {'summary': '.', '_testrun': object()})
+        self.assertEqual(cache.get('ab' * 32), {'summary': '.'})
+        self.assertEqual((cache.stored, cache.hits), (1, 1))
+
+    def test_miss_after_subject_is_edited(self):
+        spec = {'input': '2', 'output': '4\n'}
+        self.write('s.py', 'print(4)\n')
+        key = self.key('s.py', spec)
+        self.assertEqual(self.key('s.py', spec), key)
+        self.write('s.py', 'print(2 * int(input()))\n')
+        self.assertNotEqual(self.key('s.py', spec), key)
+
+    def test_miss_after_test_case_is_edited(self):
+        self.write('s.py', 'print(4)\n')
+        self.assertNotEqual(self.key('s.py', {'input': '2', 'output': '4\n'}), self.key('s.py', {'input': '2', 'output': '5\n'}))
+
+    def test_miss_after_script_suite_is_edited(self):
+        spec = {'type': 'script', 'script': 'python3 check.py {}'}
+        self.write('s.py', 'x = 1\n')
+        self.write('test_s.py', 'assert True\n')
+        key = self.key('s.py', spec, 'test_s.py')
+        self.write('test_s.py', 'assert False\n')
+        self.assertNotEqual(self.key('s.py', spec, 'test_s.py'), key)
+
+    def test_miss_after_checker_is_edited(self):
+        spec = {'type': 'script', 'script': 'python3 check.py {}'}
+        self.write('s.py', 'x = 1\n')
+        self.write('tests.yaml', 'tests: []\n')
+        self.write('check.py', 'print(".")\n')
+        key = self.key('s.py', spec)
+        self.assertEqual(self.key('s.py', spec), key)
+        self.write('check.py', 'print("F")\n')
+        self.assertNotEqual(self.key('s.py', spec), key)
+
+    def test_miss_after_output_limits_change(self):
+        spec = {'input': '2', 'output': '4\n'}
+        self.write('s.py', 'print(4)\n')
+        with mock.patch.object(tst_test, 'output_limits', return_value=(1000, 100)):
+            key = self.key('s.py', spec)
+        with mock.patch.object(tst_test, 'output_limits', return_value=(10, 100)):
+            self.assertNotEqual(self.key('s.py', spec), key)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResultCache(self.directory, max_size=1)
+        keys = [f'{i:02x}' * 32 for i in range(4)]
+        for i, key in enumerate(keys):
+            cache.put(key, {'summary': '.', 'stdout': 'x' * 100})
+            os.utime(cache._path(key), (1000 + i, 1000 + i))
+        entry_size = os.path.getsize(cache._path(keys[0]))
+        cache.get(keys[0]) # used: now the most recent
+        cache.max_size = 2 * entry_size
+        cache.evict()
+        self.assertEqual([k for k in keys if cache.get(k)], [keys[0], keys[3]])
+
+
+if __name__ == '__main__':
+    unittest.main()
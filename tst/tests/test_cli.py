@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TST = "import sys; sys.argv[0] = 'tst'; from tst.commands import main; main()"
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.home = os.path.join(self.tmp.name, 'home')
+        self.directory = os.path.join(self.tmp.name, 'work')
+        os.makedirs(os.path.join(self.home, '.tst'))
+        os.makedirs(self.directory)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, filename, text):
+        with open(os.path.join(self.directory, filename), 'w') as f:
+            f.write(text)
+
+    def tst(self, *args):
+        env = dict(os.environ, HOME=self.home, PYTHONPATH=ROOT)
+        return subprocess.run([sys.executable, '-c', TST, *args], cwd=self.directory, env=env, capture_output=True, text=True, timeout=60)
+
+    def test_fail_fast_with_diff(self):
+        self.write('tests.yaml', 'tests:\n  - input: "2"\n    output: "4\\n"\n  - input: "3"\n    output: "6\\n"\n')
+        self.write('bad.py', 'print(int(input()) + 1)\n')
+        process = self.tst('--fail-fast', '-d', '-j', '1', '--no-cache')
+        self.assertNotIn('critical error', process.stdout + process.stderr)
+        self.assertIn('bad.py F_', process.stdout)
+        self.assertIn('(Cancelled)', process.stdout)
+
+    def test_fresh_home(self):
+        shutil.rmtree(os.path.join(self.home, '.tst'))
+        self.write('tests.yaml', 'tests:\n  - input: "2"\n    output: "4\\n"\n')
+        self.write('good.py', 'print(2 * int(input()))\n')
+        process = self.tst('--no-cache')
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertNotIn('Traceback', process.stderr)
+        self.assertIn('good.py .', process.stdout)
+        self.assertTrue(os.path.exists(os.path.join(self.home, '.tst', 'logs')))
+
+    def test_batch_matches_single_runs(self):
+        # a stand-in for the undertst plugin: --clean reports just the summary
+        self.write('conftest.py', (
+            'import sys\n'
+            'summary = []\n'
+            'def pytest_addoption(parser):\n'
+            '    parser.addoption("--tst")\n'
+            '    parser.addoption("--clean", action="store_true")\n'
+            'def pytest_runtest_logreport(report):\n'
+            '    report.when == "call" and summary.append(".F"[report.failed])\n'
+            'def pytest_sessionfinish(session):\n'
+            '    if session.config.getoption("--clean"):\n'
+            '        print("".join(summary), file=sys.stderr)\n'
+            '        session.exitstatus = 0\n'
+        ))
+        self.write('test_double.py', (
+            'import pytest\n'
+            'def test_clean(request):\n'
+            '    assert request.config.getoption("--clean")\n'
+            'def test_double(request):\n'
+            '    source = open(request.config.getoption("--tst")).read()\n'
+            '    assert "2 *" in source\n'
+        ))
+        self.write('good.py', 'print(2 * int(input()))\n')
+        self.write('bad.py', 'print(int(input()) + 2)\n')
+        single = self.tst('--no-cache', '-f', 'json', 'good.py', 'bad.py')
+        batch = self.tst('--no-cache', '--batch', '-f', 'json', 'good.py', 'bad.py')
+        self.assertEqual(json.loads(single.stdout), {'good.py': {'test_double.py': '..'}, 'bad.py': {'test_double.py': '.F'}})
+        self.assertEqual(json.loads(batch.stdout), json.loads(single.stdout))
+
+
+if __name__ == '__main__':
+    unittest.main()
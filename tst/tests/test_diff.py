@@ -0,0 +1,87 @@
+import time
+import random
+import difflib
+import unittest
+
+from tst.diff import myers, compare
+
+
+def apply(ops, a, b):
+    # rebuild both sequences from an edit script
+    old = [a[i] for tag, i, j in ops if tag in ' -']
+    new = [b[j] if tag == '+' else a[i] for tag, i, j in ops if tag in ' +']
+    return old, new
+
+
+class TestMyers(unittest.TestCase):
+
+    def test_edit_script_rebuilds_both_sides(self):
+        rnd = random.Random(42)
+        for _ in range(2000):
+            a = [rnd.choice('abc') for _ in range(rnd.randint(0, 12))]
+            b = [rnd.choice('abc') for _ in range(rnd.randint(0, 12))]
+            ops = myers(a, b)
+            self.assertEqual(apply(ops, a, b), (a, b))
+            for tag, i, j in ops:
+                tag == ' ' and self.assertEqual(a[i], b[j])
+
+    def test_edit_script_is_minimal(self):
+        rnd = random.Random(7)
+        for _ in range(500):
+            a = [rnd.choice('abcd') for _ in range(rnd.randint(0, 15))]
+            b = [rnd.choice('abcd') for _ in range(rnd.randint(0, 15))]
+            edits = sum(1 for tag, _, _ in myers(a, b) if tag != ' ')
+            matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+            common = sum(block.size for block in matcher.get_matching_blocks())
+            self.assertLessEqual(edits, len(a) + len(b) - 2 * common)
+
+    def test_gives_up_beyond_max_work(self):
+        a = [str(i) for i in range(300)]
+        b = [str(-i - 1) for i in range(300)]
+        self.assertIsNone(myers(a, b, max_work=10000))
+        self.assertIsNotNone(myers(a, b))
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_same_lines_as_differ_without_hints(self):
+        rnd = random.Random(3)
+        for _ in range(500):
+            a = [rnd.choice(['x\n', 'y\n', 'z\n']) for _ in range(rnd.randint(0, 10))]
+            b = [rnd.choice(['x\n', 'y\n', 'z\n']) for _ in range(rnd.randint(0, 10))]
+            diff = list(compare(a, b))
+            self.assertEqual([l[2:] for l in diff if l[0] in ' -'], a)
+            self.assertEqual([l[2:] for l in diff if l[0] in ' +'], b)
+
+    def test_intraline_hints_for_short_hunks(self):
+        diff = list(compare(['same\n', 'the answer is 42\n'], ['same\n', 'the answer is 43\n']))
+        self.assertEqual(diff[0], '  same\n')
+        self.assertTrue(any(l.startswith('? ') for l in diff))
+
+    def test_no_intraline_hints_for_long_hunks(self):
+        a = [f'line {i}\n' for i in range(10)]
+        b = [f'line {i}!\n' for i in range(10)]
+        diff = list(compare(a, b))
+        self.assertFalse(any(l.startswith('? ') for l in diff))
+        self.assertEqual(len(diff), 20)
+
+    def test_truncated_diff(self):
+        a = [f'{i}\n' for i in range(1000)]
+        b = [f'{-i - 1}\n' for i in range(1000)]
+        diff = list(compare(['first\n'] + a, ['first\n'] + b, max_work=10000))
+        self.assertEqual(diff[0], '  first\n')
+        self.assertTrue(diff[-1].startswith('! diff truncated'))
+
+    def test_large_outputs_are_fast(self):
+        a = [f'{i}\n' for i in range(20000)]
+        b = list(a)
+        for i in range(0, 20000, 1000):
+            b[i] = 'changed\n'
+        t0 = time.perf_counter()
+        diff = list(compare(a, b))
+        self.assertLess(time.perf_counter() - t0, 2)
+        self.assertEqual(sum(1 for l in diff if l[0] == '+'), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+from tst.distributed import Coordinator, remote_names, send, receive, OUTSIDE
+
+
+class TestCoordinator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.subject = os.path.join(self.tmp.name, 'a.py')
+        with open(self.subject, 'w') as f:
+            f.write('print(1)\n')
+        self.coordinator = None
+        self.test_cases = [SimpleNamespace(test_suite='tests.yaml', index=i) for i in range(2)]
+        self.merged = []
+
+    def tearDown(self):
+        if self.coordinator:
+            self.coordinator.shutdown()
+            self.coordinator.server_close()
+        self.tmp.cleanup()
+
+    def start(self, **kwargs):
+        kwargs.setdefault('test_cases', self.test_cases)
+        kwargs.setdefault('on_result', self.merged.append)
+        self.coordinator = Coordinator(('127.0.0.1', 0), {'files': {}}, {'a.py': self.subject}, **kwargs)
+        threading.Thread(target=self.coordinator.serve_forever, daemon=True).start()
+
+    def connect(self, token=None, setup={'files': {}}):
+        # a fake worker
+        conn = socket.create_connection(self.coordinator.server_address, timeout=10)
+        self.addCleanup(conn.close)
+        rfile, wfile = conn.makefile('rb'), conn.makefile('wb')
+        send(wfile, {'token': token})
+        self.assertEqual(receive(rfile), setup)
+        return rfile, wfile
+
+    def result(self, index, summary='.', **kwargs):
+        return {'result': dict({'subject': 'a.py', 'test_suite': 'tests.yaml', 'index': index, 'summary': summary}, **kwargs)}
+
+    def wait(self):
+        results = []
+        thread = threading.Thread(target=lambda: results.extend(self.coordinator.wait()), daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), 'coordinator hangs')
+        return results
+
+    def test_remote_names(self):
+        names = remote_names(['a.py', './sub/b.py', '/abs/c.py', '../d.py'])
+        self.assertEqual(names['a.py'], 'a.py')
+        self.assertEqual(names['sub/b.py'], './sub/b.py')
+        self.assertEqual(sorted(names.values()), sorted(['a.py', './sub/b.py', '/abs/c.py', '../d.py']))
+        for name in names:
+            self.assertFalse(os.path.isabs(name) or name.startswith('..'))
+        self.assertEqual({os.path.basename(name) for name in names if name.startswith(OUTSIDE)}, {'c.py', 'd.py'})
+
+    def test_silent_worker_loses_its_shard(self):
+        self.start(timeout=0.3)
+        rfile, wfile = self.connect()
+        self.assertEqual(list(receive(rfile)['subjects']), ['a.py'])
+
+        # the shard goes to the next worker once the first one times out
+        rfile, wfile = self.connect()
+        self.assertEqual(list(receive(rfile)['subjects']), ['a.py'])
+        send(wfile, {'done': True})
+        self.assertEqual(receive(rfile), {'exit': True})
+        self.assertEqual(self.wait(), [])
+
+
+    def test_results_are_merged_as_shards_finish(self):
+        self.start()
+        rfile, wfile = self.connect()
+        receive(rfile)
+        send(wfile, self.result(0))
+        send(wfile, self.result(1, 'F'))
+        send(wfile, {'done': True})
+        self.assertEqual(receive(rfile), {'exit': True})
+        self.assertEqual(len(self.wait()), 2)
+
+        # merged before wait() returns, as if they were run locally
+        self.assertEqual([(tr['subject'], tr['_testcase'], tr['summary']) for tr in self.merged], [
+            (self.subject, self.test_cases[0], '.'),
+            (self.subject, self.test_cases[1], 'F'),
+        ])
+
+    def test_invalid_results_give_the_shard_back(self):
+        self.start()
+        for invalid in [self.result(7), self.result(0, subject='b.py'), self.result(0, summary=None), self.result(0, time='x'), {'result': []}, [1]]:
+            rfile, wfile = self.connect()
+            receive(rfile)
+            send(wfile, self.result(1))
+            send(wfile, invalid)
+            with self.assertRaises(ConnectionError):
+                receive(rfile)
+        self.assertEqual(self.merged, [])
+
+        rfile, wfile = self.connect()
+        receive(rfile)
+        send(wfile, self.result(0))
+        send(wfile, {'done': True})
+        self.assertEqual(len(self.wait()), 1)
+        self.assertEqual(len(self.merged), 1)
+
+    def test_token(self):
+        self.start(token='secret')
+        self.connect(token='wrong', setup={'error': 'invalid token'})
+        self.connect(setup={'error': 'invalid token'})
+        rfile, wfile = self.connect(token='secret')
+        self.assertEqual(list(receive(rfile)['subjects']), ['a.py'])
+
+
+if __name__ == '__main__':
+    unittest.main()
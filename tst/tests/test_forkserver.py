@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+from tst.forkserver import ForkServer
+
+
+class TestForkServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ForkServer([sys.executable])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def subject(self, code):
+        path = os.path.join(self.tmp.name, 'subject.py')
+        with open(path, 'w') as f:
+            f.write(code)
+        return path
+
+    def test_input_and_output(self):
+        child = self.server.run(self.subject('print(2 * int(input()))\n'), b'21\n', timeout=5)
+        self.assertEqual((child['returncode'], child['stdout'], child['timeout']), (0, b'42\n', False))
+        self.assertIsNotNone(child['user_time'])
+
+    def test_exit_status_and_errors(self):
+        child = self.server.run(self.subject('import sys\nsys.exit(3)\n'), b'', timeout=5)
+        self.assertEqual(child['returncode'], 3)
+        child = self.server.run(self.subject('1 / 0\n'), b'', timeout=5)
+        self.assertEqual(child['returncode'], 1)
+        self.assertIn(b'ZeroDivisionError', child['stderr'])
+
+    def test_timeout(self):
+        t0 = time.monotonic()
+        child = self.server.run(self.subject('while True: pass\n'), b'', timeout=0.5)
+        self.assertTrue(child['timeout'])
+        self.assertLess(time.monotonic() - t0, 5)
+
+        # the server goes on serving
+        child = self.server.run(self.subject('print("ok")\n'), b'', timeout=5)
+        self.assertEqual(child['stdout'], b'ok\n')
+
+    def test_output_limit(self):
+        child = self.server.run(self.subject('while True: print("x" * 1000)\n'), b'', timeout=5, stdout_limit=10000)
+        self.assertTrue(child['output_limit'])
+        self.assertFalse(child['timeout'])
+
+    def test_cwd(self):
+        child = self.server.run(self.subject('import os\nprint(os.getcwd())\n'), b'', timeout=5, cwd=self.tmp.name)
+        self.assertEqual(child['stdout'].decode().strip(), os.path.realpath(self.tmp.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
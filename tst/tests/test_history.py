@@ -0,0 +1,34 @@
+import os
+import json
+import time
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from tst.history import FailureHistory
+
+
+class TestFailureHistory(unittest.TestCase):
+
+    def test_old_and_excess_entries_are_dropped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'history.json')
+            stale = int(time.time()) - 365 * 24 * 3600
+            with open(filename, 'w') as f:
+                json.dump({'old.yaml:x': [5, 5, stale], 'older.yaml:y': [3, 1]}, f)
+
+            history = FailureHistory(filename)
+            with mock.patch('tst.history.HISTORY_SIZE', 3):
+                for i in range(5):
+                    history.record(SimpleNamespace(test_suite=f'{i}.yaml', spec={'input': i}), failed=i % 2)
+                history.save()
+
+            with open(filename) as f:
+                data = json.load(f)
+            self.assertEqual(sorted(k.split(':')[0] for k in data), ['2.yaml', '3.yaml', '4.yaml'])
+            self.assertEqual(FailureHistory(filename).rate(SimpleNamespace(test_suite='3.yaml', spec={'input': 3})), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
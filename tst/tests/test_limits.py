@@ -0,0 +1,89 @@
+import os
+import sys
+import signal
+import tempfile
+import unittest
+from unittest import mock
+
+import tst
+import tst.cache
+import tst.commands.test as tst_test
+from tst.process import run_process
+from tst.forkserver import ForkServer
+
+BUSY = 'while True: pass\n'
+GREEDY = 'data = bytearray(1024 * 1024 * 1024)\n'
+
+
+class TestResourceLimits(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ForkServer([sys.executable])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+        # keep the real ~/.tst untouched (the interpreters come from its config)
+        home = os.path.join(self.tmp.name, 'home')
+        os.makedirs(home)
+        for patcher in [
+            mock.patch.dict(os.environ, HOME=home),
+            mock.patch.object(tst.tst, 'CONFIGDIR', os.path.join(home, '.tst', '')),
+            mock.patch.object(tst.tst, 'CONFIGFILE', os.path.join(home, '.tst', 'config.yaml')),
+            mock.patch.object(tst.cache, '_fingerprints', None),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def subject(self, code):
+        with open('subject.py', 'w') as f:
+            f.write(code)
+        return os.path.abspath('subject.py')
+
+    def summary(self, code, limits, forkserver=None):
+        testcase = tst_test.TestCase({'input': '', 'output': 'ok\n'}, 'tests.yaml', 0, 0)
+        testrun = tst_test.TestRun(tst_test.TestSubject(self.subject(code)), testcase, forkserver=forkserver, limits=limits)
+        return testrun.run(timeout=20)['summary']
+
+    def test_cpu_limit(self):
+        child = run_process([sys.executable, self.subject(BUSY)], timeout=20, limits={'cpu': 1})
+        self.assertEqual(child['returncode'], -signal.SIGXCPU)
+        self.assertFalse(child['timeout'])
+
+        child = self.server.run(self.subject(BUSY), b'', timeout=20, limits={'cpu': 1})
+        self.assertEqual(child['returncode'], -signal.SIGXCPU)
+        self.assertFalse(child['timeout'])
+
+    def test_memory_limit(self):
+        child = run_process([sys.executable, self.subject(GREEDY)], timeout=20, limits={'memory': 512})
+        self.assertNotEqual(child['returncode'], 0)
+        self.assertIn(b'MemoryError', child['stderr'])
+
+        child = self.server.run(self.subject(GREEDY), b'', timeout=20, limits={'memory': 512})
+        self.assertNotEqual(child['returncode'], 0)
+        self.assertIn(b'MemoryError', child['stderr'])
+
+    def test_status_codes(self):
+        for forkserver in [None, self.server]:
+            with self.subTest(forkserver=forkserver):
+                self.assertEqual(self.summary(BUSY, {'cpu': 1}, forkserver), 'u')
+                self.assertEqual(self.summary(GREEDY, {'memory': 512}, forkserver), 'm')
+                self.assertEqual(self.summary('print("ok")\n', {'cpu': 1, 'memory': 512}, forkserver), '.')
+
+    def test_errors_without_limits_are_not_limit_errors(self):
+        self.assertEqual(self.summary('raise MemoryError\n', {}), 'e')
+
+
+if __name__ == '__main__':
+    unittest.main()
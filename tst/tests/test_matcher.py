@@ -0,0 +1,53 @@
+import re
+import random
+import unittest
+
+from tst.matcher import OrderedMatcher
+
+
+def tokens_regex(tokens, flags=0):
+    # as built by TestCase._preprocess_tokens
+    pattern = ".*\\b" + "\\b.*\\b".join([re.escape(tk) for tk in tokens]) + "\\b.*"
+    return re.compile(pattern, re.MULTILINE | re.DOTALL | flags)
+
+
+def parts_regex(parts, flags=0):
+    # as built by TestCase._preprocess_parts for out parts
+    pattern = ".*" + ".*".join(re.escape(p) for p in parts) + ".*"
+    return re.compile(pattern, re.MULTILINE | re.DOTALL | flags)
+
+
+class TestOrderedMatcher(unittest.TestCase):
+
+    ALPHABET = ['a', 'b', 'A', '1', '_', ' ', '\n', '-', '.', 'ab', '12']
+
+    def random_text(self, rnd, size):
+        return ''.join(rnd.choice(self.ALPHABET) for _ in range(size))
+
+    def test_tokens_match_like_regex(self):
+        rnd = random.Random(42)
+        for _ in range(3000):
+            tokens = [self.random_text(rnd, rnd.randint(1, 2)).strip() or 'a' for _ in range(rnd.randint(1, 3))]
+            text = self.random_text(rnd, rnd.randint(0, 20))
+            for flags, ignore_case in [(0, False), (re.IGNORECASE, True)]:
+                expected = bool(tokens_regex(tokens, flags).match(text))
+                matcher = OrderedMatcher([(tk, True) for tk in tokens], ignore_case=ignore_case)
+                self.assertEqual(matcher.match(text), expected, (tokens, text, ignore_case))
+
+    def test_parts_match_like_regex(self):
+        rnd = random.Random(7)
+        for _ in range(3000):
+            parts = [self.random_text(rnd, rnd.randint(0, 2)) for _ in range(rnd.randint(1, 3))]
+            text = self.random_text(rnd, rnd.randint(0, 20))
+            expected = bool(parts_regex(parts).match(text))
+            matcher = OrderedMatcher([(p, False) for p in parts])
+            self.assertEqual(matcher.match(text), expected, (parts, text))
+
+    def test_long_failing_output_is_fast(self):
+        text = 'x ' * 200000
+        matcher = OrderedMatcher([('x', True), ('y', True), ('z', True)])
+        self.assertFalse(matcher.match(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
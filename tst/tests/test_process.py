@@ -0,0 +1,76 @@
+import time
+import unittest
+
+from tst.process import run_process, READ_SIZE
+
+
+def alive(pid):
+    # true while the process exists (and is not a zombie)
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().split(')')[-1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+class TestRunProcess(unittest.TestCase):
+
+    def test_output_and_returncode(self):
+        child = run_process(['sh', '-c', 'cat; echo oops >&2; exit 3'], input_data=b'hello\n', timeout=5)
+        self.assertEqual(child['stdout'], b'hello\n')
+        self.assertEqual(child['stderr'], b'oops\n')
+        self.assertEqual(child['returncode'], 3)
+        self.assertFalse(child['timeout'])
+
+    def test_timeout_kills_the_whole_group(self):
+        # the grandchild would outlive a kill of the child alone
+        t0 = time.monotonic()
+        child = run_process(['sh', '-c', 'sleep 100 & echo $!; wait'], timeout=0.5)
+        self.assertTrue(child['timeout'])
+        self.assertLess(time.monotonic() - t0, 5)
+        grandchild = int(child['stdout'])
+        for _ in range(100):
+            if not alive(grandchild):
+                break
+            time.sleep(0.01)
+        self.assertFalse(alive(grandchild))
+
+    def test_timeout_after_closing_pipes(self):
+        t0 = time.monotonic()
+        child = run_process(['sh', '-c', 'exec >&- 2>&-; while :; do :; done'], timeout=0.5)
+        self.assertTrue(child['timeout'])
+        self.assertLess(time.monotonic() - t0, 5)
+
+    def test_usage(self):
+        child = run_process(['sh', '-c', 'i=0; while [ $i -lt 100000 ]; do i=$((i+1)); done'], timeout=30)
+        self.assertEqual(child['returncode'], 0)
+        self.assertGreater(child['user_time'] + child['sys_time'], 0)
+        self.assertGreater(child['maxrss'], 0)
+        self.assertGreater(child['time'], 0)
+
+
+class TestOutputLimit(unittest.TestCase):
+
+    def test_endless_output_is_cut_and_killed(self):
+        t0 = time.monotonic()
+        child = run_process(['yes'], timeout=10, stdout_limit=1000)
+        self.assertTrue(child['output_limit'])
+        self.assertFalse(child['timeout'])
+        self.assertLess(time.monotonic() - t0, 5)
+        # reading stops right after the limit is exceeded
+        self.assertGreater(len(child['stdout']), 1000)
+        self.assertLessEqual(len(child['stdout']), 1000 + READ_SIZE)
+
+    def test_each_stream_has_its_own_limit(self):
+        child = run_process(['sh', '-c', 'head -c 5000 /dev/zero >&2'], timeout=10, stdout_limit=10, stderr_limit=10000)
+        self.assertFalse(child['output_limit'])
+        self.assertEqual(len(child['stderr']), 5000)
+
+    def test_reports_are_truncated_at_the_limit(self):
+        from tst.commands.test import truncate
+        self.assertEqual(truncate('abc', 3), 'abc')
+        self.assertEqual(truncate('abcdef', 3), 'abc\n[... 3 characters truncated]\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
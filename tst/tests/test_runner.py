@@ -0,0 +1,86 @@
+import io
+import os
+import tempfile
+import threading
+import contextlib
+import unittest
+from unittest import mock
+
+import tst
+import tst.cache
+from tst.runner import Runner
+from tst.utils import cprint, quiet
+
+
+class TestRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+        # keep the real ~/.tst untouched (config, fingerprints, results, etc.)
+        home = os.path.join(self.tmp.name, 'home')
+        os.makedirs(home)
+        for patcher in [
+            mock.patch.dict(os.environ, HOME=home),
+            mock.patch.object(tst.tst, 'CONFIGDIR', os.path.join(home, '.tst', '')),
+            mock.patch.object(tst.tst, 'CONFIGFILE', os.path.join(home, '.tst', 'config.yaml')),
+            mock.patch.object(tst.cache, '_fingerprints', None),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write(self, filename, text):
+        with open(filename, 'w') as f:
+            f.write(text)
+
+    def test_run(self):
+        self.write('tests.yaml', 'tests:\n  - input: "2"\n    output: "4\\n"\n')
+        self.write('good.py', 'print(2 * int(input()))\n')
+        self.write('bad.py', 'print(int(input()) + 1)\n')
+        with Runner(['tests.yaml'], cache=False) as runner:
+            self.assertEqual(runner.run(['good.py', 'bad.py']), {'good.py': {'tests.yaml': '.'}, 'bad.py': {'tests.yaml': 'F'}})
+
+    def test_invalid_suite_raises_instead_of_exiting(self):
+        self.write('tests.yaml', 'tests:\n  - foo: 1\n')
+        with self.assertRaises(tst.TstError):
+            Runner(['tests.yaml'], cache=False)
+
+    def test_missing_suite_raises(self):
+        with self.assertRaises(tst.TstError):
+            Runner(['nope.yaml'], cache=False)
+
+    def test_home_is_isolated(self):
+        self.write('tests.yaml', 'tests:\n  - input: "2"\n    output: "4\\n"\n')
+        self.write('good.py', 'print(2 * int(input()))\n')
+        with Runner(['tests.yaml']) as runner:
+            runner.run(['good.py'])
+        for name in ['config.yaml', 'results']:
+            self.assertTrue(os.path.exists(os.path.join(self.tmp.name, 'home', '.tst', name)))
+
+    def test_run_test_messages(self):
+        self.write('tests.yaml', 'tests:\n  - foo: 1\n')
+        for include_stderr in [True, False]:
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr), self.assertRaises(tst.TstError):
+                tst.run_test(['good.py'], 'tests.yaml', include_stderr=include_stderr)
+            self.assertEqual('invalid' in stderr.getvalue(), include_stderr)
+
+    def test_quiet_is_per_thread(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), quiet():
+            cprint('', 'dropped')
+            thread = threading.Thread(target=cprint, args=('', 'shown'))
+            thread.start()
+            thread.join()
+        self.assertNotIn('dropped', stderr.getvalue())
+        self.assertIn('shown', stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import time
+import threading
+import unittest
+from unittest import mock
+
+from tst.scheduler import Scheduler, AdaptiveLimit
+
+
+class TestScheduler(unittest.TestCase):
+
+    def run_jobs(self, jobs, limit, count=40):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0, 'done': 0}
+
+        def worker(job):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.002)
+            with lock:
+                state['running'] -= 1
+                state['done'] += 1
+
+        scheduler = Scheduler(worker, jobs=jobs)
+        scheduler.set_limit(limit)
+        for i in range(count):
+            scheduler.submit(i)
+        scheduler.start()
+        scheduler.join()
+        return state
+
+    def test_all_jobs_run(self):
+        state = self.run_jobs(jobs=4, limit=4)
+        self.assertEqual(state['done'], 40)
+
+    def test_limit_bounds_concurrency(self):
+        # every idle worker must leave on join, even when limited
+        state = self.run_jobs(jobs=8, limit=2)
+        self.assertEqual(state['done'], 40)
+        self.assertLessEqual(state['peak'], 2)
+
+    def test_limit_is_capped_by_jobs(self):
+        scheduler = Scheduler(lambda job: None, jobs=3)
+        scheduler.set_limit(10)
+        self.assertEqual(scheduler.limit, 3)
+        scheduler.set_limit(0)
+        self.assertEqual(scheduler.limit, 1)
+
+    def test_cancel_pending_jobs(self):
+        scheduler = Scheduler(lambda job: None, jobs=1)
+        for i in range(10):
+            scheduler.submit(i)
+        cancelled = scheduler.cancel(lambda job: job % 2)
+        self.assertEqual(cancelled, [1, 3, 5, 7, 9])
+        self.assertEqual(scheduler.counts(), (5, 0, 5))
+
+
+class TestAdaptiveLimit(unittest.TestCase):
+
+    def adaptive(self, load=0.0, memory=0.5):
+        scheduler = Scheduler(lambda job: None, jobs=8)
+        patches = [
+            mock.patch('os.cpu_count', return_value=4),
+            mock.patch('os.getloadavg', return_value=(load * 4, 0, 0)),
+            mock.patch('tst.scheduler.available_memory', return_value=memory),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return scheduler, AdaptiveLimit(scheduler)
+
+    def test_starts_at_cpu_count(self):
+        scheduler, adaptive = self.adaptive()
+        self.assertEqual(scheduler.limit, 4)
+
+    def test_grows_while_busy_and_idle_machine(self):
+        scheduler, adaptive = self.adaptive(load=0.5)
+        for i in range(20):
+            scheduler.submit(i)
+        scheduler.running = scheduler.limit
+        self.assertEqual(adaptive.adjust(), (5, 'room for more'))
+
+    def test_backs_off_on_load(self):
+        scheduler, adaptive = self.adaptive(load=2.0)
+        limit, reason = adaptive.adjust()
+        self.assertEqual(limit, 2)
+        self.assertIn('load average', reason)
+
+    def test_backs_off_on_memory_pressure(self):
+        scheduler, adaptive = self.adaptive(memory=0.05)
+        limit, reason = adaptive.adjust()
+        self.assertEqual(limit, 2)
+        self.assertIn('memory', reason)
+
+    def test_backs_off_on_rising_timeouts(self):
+        scheduler, adaptive = self.adaptive()
+        for _ in range(20):
+            adaptive.observe('t1', 0.1)
+        self.assertEqual(adaptive.adjust(), (4, None))
+        for _ in range(5):
+            adaptive.observe('t1', 10, timeout=True)
+        limit, reason = adaptive.adjust()
+        self.assertEqual(limit, 2)
+        self.assertIn('timeouts', reason)
+
+    def test_backs_off_on_slowdown(self):
+        scheduler, adaptive = self.adaptive()
+        adaptive.observe('t1', 0.1)
+        adaptive.observe('t2', 1.0)
+        adaptive.adjust()
+        adaptive.observe('t1', 0.5)
+        adaptive.observe('t2', 3.0)
+        limit, reason = adaptive.adjust()
+        self.assertEqual(limit, 2)
+        self.assertIn('slower', reason)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import json
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+
+import tst
+import tst.cache
+from tst.commands.serve import GradingServer
+
+
+class TestServe(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+        # keep the real ~/.tst untouched (config, fingerprints, results, etc.)
+        home = os.path.join(self.tmp.name, 'home')
+        os.makedirs(home)
+        for patcher in [
+            mock.patch.dict(os.environ, HOME=home),
+            mock.patch.object(tst.tst, 'CONFIGDIR', os.path.join(home, '.tst', '')),
+            mock.patch.object(tst.tst, 'CONFIGFILE', os.path.join(home, '.tst', 'config.yaml')),
+            mock.patch.object(tst.cache, '_fingerprints', None),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.write('tests.yaml', 'tests:\n  - input: "2"\n    output: "4\\n"\n')
+        self.write('good.py', 'print(2 * int(input()))\n')
+        options = SimpleNamespace(concurrency=1, backlog=1, ignore=[], timeout=10, jobs=1, fork_server=False, cache=False)
+        self.path = os.path.join(self.tmp.name, 'tst.sock')
+        self.server = GradingServer(self.path, options)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server.close()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write(self, filename, text):
+        with open(filename, 'w') as f:
+            f.write(text)
+
+    def request(self, *lines):
+        # sends each line on the same connection and returns the responses
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(30)
+            conn.connect(self.path)
+            responses = []
+            with conn.makefile('rb') as rfile:
+                for line in lines:
+                    line = line if isinstance(line, str) else json.dumps(line)
+                    conn.sendall(line.encode('utf-8') + b'\n')
+                    responses.append(json.loads(rfile.readline()))
+            return responses
+
+    def test_subject_and_source_requests(self):
+        responses = self.request(
+            {'suite': 'tests.yaml', 'subject': 'good.py'},
+            {'suite': ['tests.yaml'], 'filename': 'bad.py', 'source': 'print(5)\n'},
+        )
+        self.assertEqual(responses, [{'good.py': {'tests.yaml': '.'}}, {'bad.py': {'tests.yaml': 'F'}}])
+
+    def test_error_replies(self):
+        self.write('invalid.yaml', 'tests:\n  - foo: 1\n')
+        responses = self.request(
+            'not json',
+            {'subject': 'good.py'},
+            {'suite': 'nope.yaml', 'subject': 'good.py'},
+            {'suite': 'invalid.yaml', 'subject': 'good.py'},
+        )
+        self.assertTrue(all(set(r) == {'error'} for r in responses), responses)
+        self.assertTrue(responses[0]['error'].startswith('invalid request'))
+        self.assertTrue(responses[1]['error'].startswith('invalid request'))
+        self.assertIn('nope.yaml', responses[2]['error'])
+        self.assertIn('invalid', responses[3]['error'])
+
+        # the connection and the server go on
+        self.assertEqual(self.request({'suite': 'tests.yaml', 'subject': 'good.py'}), [{'good.py': {'tests.yaml': '.'}}])
+
+    def test_busy(self):
+        # the backlog (1 job) is taken: new jobs are refused right away
+        self.server.waiting.acquire()
+        try:
+            self.assertEqual(self.request({'suite': 'tests.yaml', 'subject': 'good.py'}), [{'error': 'busy'}])
+        finally:
+            self.server.waiting.release()
+        self.assertEqual(self.request({'suite': 'tests.yaml', 'subject': 'good.py'}), [{'good.py': {'tests.yaml': '.'}}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import sys
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# modules that must not be imported just to start tst
+HEAVY_MODULES = ['pkg_resources', 'distutils', 'setuptools', 'requests', 'cachecontrol', 'yaml']
+
+
+def import_in_subprocess(module):
+    code = (
+        "import sys, time\n"
+        "t0 = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - t0)\n"
+        "print(' '.join(sys.modules))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, env=env)
+    elapsed, modules = output.decode('utf-8').split('\n', 1)
+    return float(elapsed), set(modules.split())
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_entry_point_imports_no_heavy_modules(self):
+        elapsed, modules = import_in_subprocess('tst.commands')
+        print(f"import tst.commands: {1000 * elapsed:.1f} ms", file=sys.stderr)
+        self.assertEqual(modules & set(HEAVY_MODULES), set())
+
+    def test_version_command_imports_no_network_modules(self):
+        _, modules = import_in_subprocess('tst.commands.version')
+        self.assertEqual(modules & {'requests', 'cachecontrol', 'pkg_resources'}, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
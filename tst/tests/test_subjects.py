@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import tst
+
+from tst.commands.test import select_subjects, discover_files
+
+
+class TestSubjects(unittest.TestCase):
+
+    def test_select_subjects(self):
+        test_cases = [SimpleNamespace(fnmatch=['*.py', '*.c'])] * 100 + [SimpleNamespace(fnmatch=['*.java'])]
+        filenames = ['a.py', 'b.c', 'C.java', 'notes.txt', 'tests.yaml', 'test_a.py', 'tst.yaml', 'sub/d.py', 'sub/test_d.py']
+        subjects = select_subjects(filenames, test_cases, ['tests.yaml'], ['tst.yaml', 'test_*.py'])
+        self.assertEqual(subjects, {'a.py', 'b.c', 'C.java', 'sub/d.py'})
+
+    def test_default_spec_ignores_test_files(self):
+        # ignore entries are fnmatch patterns: test files are not subjects
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                ignore = tst.read_specification()['ignore']
+            finally:
+                os.chdir(cwd)
+
+        test_cases = [SimpleNamespace(fnmatch=['*.py'])]
+        filenames = ['x.py', 'test_x.py', 'x_test.py', 'x_tests.py', 'sub/test_y.py', 'sub/y.py']
+        self.assertEqual(select_subjects(filenames, test_cases, [], ignore), {'x.py', 'sub/y.py'})
+
+    def test_discover_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for fn in ['a.py', 'sub/b.py', 'sub/deeper/c.py', '.git/d.py', '__pycache__/e.py', 'venv/f.py']:
+                path = os.path.join(directory, fn)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                open(path, 'w').close()
+
+            files = discover_files(directory, ignore=['venv'])
+            self.assertEqual([os.path.relpath(fn, directory) for fn in files], ['a.py', 'sub/b.py', 'sub/deeper/c.py'])
+
+
+if __name__ == '__main__':
+    unittest.main()
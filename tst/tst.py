@@ -3,40 +3,41 @@ from builtins import str
 import sys
 import os
 import io
-import json
-import pkg_resources
-import logging
-import subprocess
+import contextlib
 
 from .jsonfile import JsonFile, CorruptedJsonFile
 from .colors import *
-from .utils import cprint, _assert
+from .utils import cprint, _assert, quiet
 
 CONFIGDIR = os.path.expanduser('~/.tst/')
-LOG_FILE = os.path.expanduser('~/.tst/logs.txt')
 CONFIGFILE = CONFIGDIR + 'config.yaml'
 
 def coverit():
     return 1
 
 
+_runners = {}
+
+
 def run_test(subjects, test_suite, include_stderr=True, timeout=120):
-    command = f"tst -T {timeout} -f json -t {test_suite} -- {' '.join(subjects)}"
-    try:
-        if include_stderr:
-            stderr = subprocess.STDOUT
-        else:
-            stderr = subprocess.DEVNULL
-        output = subprocess.check_output(command.split(), stderr=stderr)
-        results = json.loads(output)
-        return [results.get(s, {}) for s in subjects]
-
-    except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
-        print("----- error running tst -----")
-        print(e)
-        print("-----------------------------")
-        raise e
-        
+    # runs in-process; parsed suites are kept for later calls (while unchanged).
+    # Messages tst shows (e.g. errors) are dropped unless include_stderr is
+    # set. Errors (e.g. an invalid tst.yaml) raise TstError.
+    from .runner import Runner, raising
+
+    with contextlib.nullcontext() if include_stderr else quiet():
+        key = (test_suite, timeout)
+        runner = _runners.get(key)
+        if runner is None or runner.is_stale():
+            runner and runner.close()
+            with raising():
+                ignore = read_specification()['ignore']
+            runner = _runners[key] = Runner(test_suite.split(), ignore=ignore, timeout=timeout)
+
+        results = runner.run(subjects)
+
+    return [results.get(s, {}) for s in subjects]
+
 
 def get_config():
     if not os.path.exists(CONFIGFILE):
@@ -52,10 +53,6 @@ def get_config():
                 "  mjs: node\n"
             )
 
-    if not os.path.exists(LOG_FILE):
-        open(LOG_FILE, 'w').close()
-    logging.basicConfig(filename=LOG_FILE, level=logging.DEBUG, format='%(asctime)s (%(levelname)s@%(name)s) %(message)s', datefmt='%Y-%m-%dT%H:%M:%S')
-
     return JsonFile(CONFIGFILE)
 
 
@@ -90,6 +87,7 @@ def read_specification():
         "require": [],
         "filenames": "*.py",
         "subjects": "*.py",
+        # fnmatch patterns (matched against paths and names) of files that are never subjects
         "ignore": ["tst.yaml", "tst.json", "*_tests.yaml", "*_tests.py", "test_*.py", "*_test.py"],
         "test-command": { ".py": "python3" }
     }
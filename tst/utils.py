@@ -1,13 +1,34 @@
 from builtins import str
 
+import os
 import sys
 import string
 import json
 import logging
+import threading
+import contextlib
 
 from .colors import *
 
-def cprint(color, msg, file=sys.stderr, end='\n'):
+_messages = threading.local()
+
+
+@contextlib.contextmanager
+def quiet():
+    # drops the messages cprint shows in this thread (e.g. errors the library
+    # api raises anyway); other threads and other output are not affected
+    previous = getattr(_messages, 'quiet', False)
+    _messages.quiet = True
+    try:
+        yield
+    finally:
+        _messages.quiet = previous
+
+
+def cprint(color, msg, file=None, end='\n'):
+    if getattr(_messages, 'quiet', False):
+        return
+
     if type(msg) is str:
         data = msg
     # 2to3: elif type(msg) is str:
@@ -16,7 +37,41 @@ def cprint(color, msg, file=sys.stderr, end='\n'):
     else:
         data = str(msg)
 
-    print(color + data + RESET, file=file, end=end)
+    print(color + data + RESET, file=file or sys.stderr, end=end)
+
+
+def log_handler(filename='~/.tst/logs'):
+    # the handler opens the file on the first record: make sure its
+    # directory exists by then (it doesn't on a fresh HOME)
+    filename = os.path.expanduser(filename)
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    except OSError:
+        pass
+
+    handler = logging.FileHandler(filename, delay=True)
+    handler.setFormatter(logging.Formatter('%(asctime)s|%(name)s|%(levelname)s|%(message)s'))
+    return handler
+
+
+class TstExit(SystemExit):
+
+    # Exits with status 1 (as sys.exit(1) would), but keeps the message for
+    # code catching it (e.g. tst serve, the library api).
+
+    def __init__(self, msg):
+        super().__init__(1)
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
+class TstError(Exception):
+
+    # Errors of the library api (e.g. Runner, run_test), which raises this
+    # where the cli would exit.
+    pass
 
 
 def _assert(condition, msg):
@@ -24,8 +79,8 @@ def _assert(condition, msg):
         return
 
     cprint(LRED, msg)
-    logging.error(msg)
-    sys.exit(1)
+    log.error(msg)
+    raise TstExit(msg)
 
 
 def to_unicode(obj, encoding='utf-8'):
@@ -42,3 +97,8 @@ def to_unicode(obj, encoding='utf-8'):
             pass
 
     assert False, "tst: non-recognized encoding"
+
+
+log = logging.getLogger('tst-utils')
+log.setLevel(logging.DEBUG)
+log.addHandler(log_handler())
@@ -0,0 +1,132 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+POLL_INTERVAL = 1 # seconds between directory scans (without inotify)
+SETTLE_TIME = 0.2 # editors save files in several steps: wait for them
+
+# inotify(7) events of interest
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_EVENTS = IN_CLOSE_WRITE | IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+
+class Watcher:
+
+    # Reports the paths of files changed (created, modified or removed) in
+    # a directory (and others added later), relative to the current one. Uses
+    # inotify through libc when available and falls back to polling
+    # modification times elsewhere.
+
+    def __init__(self, directory='.'):
+        self.directories = {} # directory -> inotify watch descriptor
+        self.snapshot = {}
+        self.fd = self._inotify()
+        self.add(directory)
+        if self.fd is not None and not self.directories:
+            # inotify is there, but can't watch here: poll instead
+            self.close()
+            self.add(directory)
+
+    def _inotify(self):
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError, TypeError):
+            return None
+
+        if fd < 0:
+            return None
+
+        return fd
+
+    def add(self, directory):
+        # also watch directory (not its subdirectories)
+        directory = os.path.normpath(directory)
+        if directory in self.directories or not os.path.isdir(directory):
+            return
+
+        if self.fd is None:
+            self.directories[directory] = None
+            self.snapshot.update(self._snapshot([directory]))
+            return
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_EVENTS)
+        if wd >= 0:
+            self.directories[directory] = wd
+
+    def _snapshot(self, directories=None):
+        snapshot = {}
+        for directory in directories or list(self.directories):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                    snapshot[os.path.normpath(os.path.join(directory, entry.name))] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    pass
+
+        return snapshot
+
+    def _read_events(self, timeout):
+        names = set()
+        directories = {wd: directory for directory, wd in self.directories.items()}
+        while select.select([self.fd], [], [], timeout)[0]:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if name and wd in directories:
+                    names.add(os.path.normpath(os.path.join(directories[wd], os.fsdecode(name))))
+
+            timeout = SETTLE_TIME
+
+        return names
+
+    def _poll(self):
+        snapshot = self._snapshot()
+        names = {n for n in snapshot.keys() | self.snapshot.keys() if snapshot.get(n) != self.snapshot.get(n)}
+        self.snapshot = snapshot
+        return names
+
+    def changes(self):
+        # blocks until some file changes
+        while True:
+            if self.fd is not None:
+                names = self._read_events(None)
+            else:
+                time.sleep(POLL_INTERVAL)
+                names = self._poll()
+                names and time.sleep(SETTLE_TIME)
+                names |= self._poll()
+
+            if names:
+                return names
+
+    def close(self):
+        self.fd is not None and os.close(self.fd)
+        self.fd = None